@@ -21,7 +21,12 @@
 
         
         "views/debtor_kpi_views.xml",
+        "views/risk_perf_log_views.xml",
+        "wizard/debtor_kpi_export_views.xml",
+        "wizard/risk_simulation_views.xml",
         "data/ir_cron_debtor_kpi.xml",
+        "data/ir_cron_debtor_kpi_history.xml",
+        "data/ir_cron_risk_dirty_queue.xml",
     ],
     "assets": {},
     "installable": True,
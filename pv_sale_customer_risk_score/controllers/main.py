@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import csv
+import datetime
+import io
+import os
+import tempfile
+
+from werkzeug.exceptions import NotFound
+
+from odoo import http
+from odoo.http import content_disposition, request
+
+# Bytes per chunk sent to the client
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+def _csv_stream(headers, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= STREAM_BLOCK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _xlsx_stream(headers, rows):
+    """
+    Rows are written with xlsxwriter's constant_memory mode (flushed to a
+    temporary file row by row); the workbook is then sent in blocks.
+    """
+    import xlsxwriter
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        sheet = workbook.add_worksheet("Debtors")
+        bold = workbook.add_format({"bold": True})
+        date_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+        sheet.write_row(0, 0, headers, bold)
+        for row_index, row in enumerate(rows, start=1):
+            for col_index, value in enumerate(row):
+                if isinstance(value, datetime.datetime):
+                    sheet.write_datetime(row_index, col_index, value, date_format)
+                else:
+                    sheet.write(row_index, col_index, value)
+        workbook.close()
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(STREAM_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+    finally:
+        os.unlink(path)
+
+
+class PvDebtorKpiExportController(http.Controller):
+
+    @http.route("/pv_sale_customer_risk/debtors/export/<int:wizard_id>", type="http", auth="user")
+    def export_debtors(self, wizard_id, **kwargs):
+        wizard = request.env["pv.debtor.kpi.export"].browse(wizard_id).exists()
+        if not wizard:
+            raise NotFound()
+        headers, rows = wizard._export_stream()
+        if wizard.file_format == "xlsx":
+            body = _xlsx_stream(headers, rows)
+            mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        else:
+            body = _csv_stream(headers, rows)
+            mimetype = "text/csv;charset=utf-8"
+        return request.make_response(
+            body,
+            headers=[
+                ("Content-Type", mimetype),
+                ("Content-Disposition", content_disposition(wizard._export_filename())),
+            ],
+        )
@@ -1,6 +1,13 @@
 # -*- coding: utf-8 -*-
 
+from . import risk_cron
 from . import res_config_settings
 from . import res_partner
 from . import sale_order
+from . import account_move
+from . import account_move_line
 from . import debtor_kpi
+from . import debtor_kpi_history
+from . import debtor_kpi_view
+from . import risk_dirty_queue
+from . import risk_perf_log
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+from odoo.tools.sql import create_index
+
+
+class AccountMove(models.Model):
+    _inherit = 'account.move'
+
+    def init(self):
+        super().init()
+        # Companies in which a shared customer is active (pv.debtor.kpi._shared_customer_companies)
+        create_index(
+            self.env.cr,
+            'pv_account_move_commercial_partner_idx',
+            self._table,
+            ['commercial_partner_id', 'company_id'],
+            where="state = 'posted' AND move_type IN ('out_invoice', 'out_refund')",
+        )
+
+    def _post(self, soft=True):
+        posted = super()._post(soft=soft)
+        self.env['pv.risk.dirty.partner']._enqueue_moves(posted)
+        return posted
+
+    def button_draft(self):
+        res = super().button_draft()
+        self.env['pv.risk.dirty.partner']._enqueue_moves(self)
+        return res
+
+
+class AccountPartialReconcile(models.Model):
+    _inherit = 'account.partial.reconcile'
+
+    # Payments, credit note matching and unreconciliation move residuals
+    @api.model_create_multi
+    def create(self, vals_list):
+        partials = super().create(vals_list)
+        self.env['pv.risk.dirty.partner']._enqueue_move_lines(
+            partials.debit_move_id | partials.credit_move_id
+        )
+        return partials
+
+    def unlink(self):
+        self.env['pv.risk.dirty.partner']._enqueue_move_lines(
+            self.debit_move_id | self.credit_move_id
+        )
+        return super().unlink()
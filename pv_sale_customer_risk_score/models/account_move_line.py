@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from odoo import models
+from odoo.tools.sql import create_index
+
+
+class AccountMoveLine(models.Model):
+    _inherit = 'account.move.line'
+
+    def init(self):
+        super().init()
+        # Open receivable exposure per customer (res.partner._risk_receivable_aggregate)
+        create_index(
+            self.env.cr,
+            'pv_account_move_line_open_partner_idx',
+            self._table,
+            ['partner_id', 'company_id'],
+            where="reconciled IS NOT TRUE AND parent_state = 'posted'",
+        )
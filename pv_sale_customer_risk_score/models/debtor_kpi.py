@@ -1,13 +1,65 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 
 from odoo import api, fields, models
+from odoo.tools import SQL, split_every
 
+from ..tools import risk_cache, risk_scoring
 
-class PvDebtorKpi(models.Model):
-    _name = "pv.debtor.kpi"
-    _description = "Debtor KPI Snapshot"
-    _order = "company_id, overdue_ratio desc, outstanding desc"
+# Receivable aging columns, filled from res.partner._risk_aggregate_batch
+_AGING_COLUMNS = (
+    "aging_current",
+    "aging_0_30",
+    "aging_31_60",
+    "aging_61_90",
+    "aging_90_plus",
+    "dso",
+    "avg_days_overdue",
+)
+# Exposure not posted yet, from res.partner._risk_aggregate_batch
+_PENDING_COLUMNS = (
+    "to_invoice",
+    "draft_invoiced",
+)
+# Columns written by the bulk upsert (besides the log-access columns)
+_KPI_COLUMNS = (
+    "company_id",
+    "commercial_partner_id",
+    "outstanding",
+    "credit_open",
+    "overdue",
+    "credit_limit",
+    "credit_util_pct",
+    "overdue_ratio",
+    "orders_in_window",
+    "risk_score",
+    "risk_level",
+    "last_updated",
+) + _AGING_COLUMNS + _PENDING_COLUMNS
+UPSERT_CHUNK_SIZE = 1000
+KPI_HIGH_WATER_MARK_PARAM = "pv_sale_customer_risk.kpi_last_refresh"
+KPI_CRON_JOB = "debtor_kpi"
+# Margin kept below the oldest running transaction when taking the mark
+KPI_HIGH_WATER_MARK_OVERLAP = timedelta(minutes=5)
+# "table" (pv.debtor.kpi, refreshed by the ORM) or "matview" (pv.debtor.kpi.view)
+KPI_BACKEND_PARAM = "pv_sale_customer_risk.kpi_backend"
+RISK_LEVELS = ("low", "medium", "high")
+# RiskConfig fields a what-if simulation may override
+SIMULATION_PARAMS = (
+    "threshold_low",
+    "threshold_high",
+    "weight_credit",
+    "weight_overdue",
+    "weight_activity",
+    "target_orders",
+)
+
+
+class PvDebtorKpiMixin(models.AbstractModel):
+    _name = "pv.debtor.kpi.mixin"
+    _description = "Debtor KPI Columns"
 
     company_id = fields.Many2one(
         "res.company",
@@ -26,12 +78,40 @@ class PvDebtorKpi(models.Model):
     # Overdue invoices residual
     overdue = fields.Float(string="Overdue (Invoices)", digits=(16, 2))
 
+    # Exposure not posted yet (counted in the credit utilization)
+    to_invoice = fields.Float(
+        string="To Invoice",
+        digits=(16, 2),
+        help="Ordered amount (taxes included) of confirmed orders not invoiced yet, in company "
+             "currency. Quantities on draft invoices are counted in Draft Invoices instead.",
+    )
+    draft_invoiced = fields.Float(
+        string="Draft Invoices",
+        digits=(16, 2),
+        help="Receivable amount of draft invoices and credit notes; "
+             "counted in the credit utilization when enabled in the settings.",
+    )
+
     # Other KPIs
     credit_limit = fields.Float(string="Credit Limit", digits=(16, 2))
     credit_util_pct = fields.Float(string="Credit Util %", digits=(16, 2))
     overdue_ratio = fields.Float(string="Overdue Ratio", digits=(16, 4))
     orders_in_window = fields.Integer(string="Orders in Window")
 
+    # Aging of open invoice residuals by days past due
+    aging_current = fields.Float(string="Not Due", digits=(16, 2))
+    aging_0_30 = fields.Float(string="1-30 Days", digits=(16, 2))
+    aging_31_60 = fields.Float(string="31-60 Days", digits=(16, 2))
+    aging_61_90 = fields.Float(string="61-90 Days", digits=(16, 2))
+    aging_90_plus = fields.Float(string="90+ Days", digits=(16, 2))
+    dso = fields.Float(string="DSO (Days)", digits=(16, 1), aggregator="avg")
+    avg_days_overdue = fields.Float(
+        string="Avg Days Overdue",
+        digits=(16, 1),
+        aggregator="avg",
+        help="Average days past due of overdue invoices, weighted by residual.",
+    )
+
     risk_score = fields.Integer(string="Risk Score")
     risk_level = fields.Selection(
         [("low", "Low"), ("medium", "Medium"), ("high", "High")],
@@ -40,6 +120,75 @@ class PvDebtorKpi(models.Model):
 
     last_updated = fields.Datetime(string="Last Updated", default=fields.Datetime.now)
 
+    @api.model
+    def _kpi_backend(self):
+        backend = self.env["ir.config_parameter"].sudo().get_param(KPI_BACKEND_PARAM, "table")
+        return backend if backend in ("table", "matview") else "table"
+
+    @api.model
+    def simulate_rescoring(self, overrides, domain=None):
+        """
+        What-if re-scoring: score the stored KPI rows matching `domain` again
+        with each company's configuration updated by `overrides` (a dict of
+        SIMULATION_PARAMS), in memory, from the stored credit utilization,
+        overdue ratio and order count. Nothing is written. Returns
+          - matrix:  {current level: {simulated level: customers}}
+          - total:   rows scored
+          - changed: [{company_id, commercial_partner_id, level, score,
+                       new_level, new_score}] for rows changing level
+        """
+        unknown = set(overrides) - set(SIMULATION_PARAMS)
+        if unknown:
+            raise ValueError("Unknown simulation parameters: %s" % ", ".join(sorted(unknown)))
+        self.check_access("read")
+        self.flush_model()
+        query = self._search(domain or [], order="company_id, id")
+        table = query.table
+        self.env.cr.execute(query.select(*(
+            SQL.identifier(table, fname)
+            for fname in (
+                "company_id", "commercial_partner_id", "credit_util_pct", "overdue_ratio",
+                "orders_in_window", "risk_score", "risk_level",
+            )
+        )))
+        by_company = defaultdict(list)
+        for row in self.env.cr.fetchall():
+            by_company[row[0]].append(row)
+
+        Partner = self.env["res.partner"]
+        matrix = {level: dict.fromkeys(RISK_LEVELS, 0) for level in RISK_LEVELS}
+        changed = []
+        total = 0
+        for company_id, rows in by_company.items():
+            config = Partner._get_risk_config(self.env["res.company"].browse(company_id))._replace(**overrides)
+            new_scores, new_levels = risk_scoring.score_levels(
+                [row[2] or 0.0 for row in rows],
+                [row[3] or 0.0 for row in rows],
+                [row[4] or 0 for row in rows],
+                config,
+            )
+            total += len(rows)
+            for row, new_score, new_level in zip(rows, new_scores, new_levels):
+                level = row[6] or "low"
+                matrix[level][new_level] += 1
+                if new_level != level:
+                    changed.append({
+                        "company_id": company_id,
+                        "commercial_partner_id": row[1],
+                        "level": level,
+                        "score": row[5],
+                        "new_level": new_level,
+                        "new_score": new_score,
+                    })
+        return {"matrix": matrix, "total": total, "changed": changed}
+
+
+class PvDebtorKpi(models.Model):
+    _name = "pv.debtor.kpi"
+    _inherit = ["pv.debtor.kpi.mixin", "pv.risk.cron.mixin"]
+    _description = "Debtor KPI Snapshot"
+    _order = "company_id, overdue_ratio desc, outstanding desc"
+
     _sql_constraints = [
         (
             "uniq_company_partner",
@@ -52,119 +201,447 @@ class PvDebtorKpi(models.Model):
     def _get_window_days_for_company(self, partner, company):
         return partner._get_activity_window_days_for_company(company)
 
-    def _get_thresholds_for_company(self, partner, company):
-        return partner._get_thresholds_for_company(company)
-
     def _get_credit_limit_for_partner(self, partner, company):
         return partner._get_partner_credit_limit(company)
 
-    # -------- Public APIs --------
+    # -------- Bulk upsert --------
+    def _upsert_rows(self, rows):
+        """
+        Insert or update KPI rows in bulk (one statement per chunk) using the
+        uniq_company_partner constraint as conflict target.
+        `rows` is a list of dicts keyed by _KPI_COLUMNS.
+        """
+        if not rows:
+            return
+        self.flush_model()
+        uid = self.env.uid
+        now_dt = fields.Datetime.now()
+        columns = _KPI_COLUMNS + ("create_uid", "create_date", "write_uid", "write_date")
+        updated = [c for c in columns if c not in ("company_id", "commercial_partner_id", "create_uid", "create_date")]
+        for offset in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            chunk = rows[offset:offset + UPSERT_CHUNK_SIZE]
+            values = SQL(", ").join(
+                SQL("%s", tuple(row[c] for c in _KPI_COLUMNS) + (uid, now_dt, uid, now_dt))
+                for row in chunk
+            )
+            self.env.cr.execute(SQL(
+                """
+                INSERT INTO %s (%s) VALUES %s
+                ON CONFLICT (company_id, commercial_partner_id) DO UPDATE SET %s
+                """,
+                SQL.identifier(self._table),
+                SQL(", ").join(SQL.identifier(c) for c in columns),
+                values,
+                SQL(", ").join(SQL("%s = EXCLUDED.%s", SQL.identifier(c), SQL.identifier(c)) for c in updated),
+            ))
+        self.invalidate_model()
+        self.env["pv.debtor.kpi.history"]._record_rows(rows)
+
     @api.model
-    def action_refresh_from_partners(self, partners=None):
+    def _delete_stale_rows(self, pairs, commercial_partner_ids=None):
         """
-        Refresh KPI rows for given partners; if None, refresh all commercial customers.
-        Calculates:
-          - outstanding = sum open residuals of invoices
-          - credit_open = sum open residuals of credit notes
-          - overdue = sum open residuals of invoices past due
-          - overdue_ratio = max(0, (overdue - credit_open)) / outstanding   (if outstanding > 0)
+        Delete the KPI rows (of `commercial_partner_ids`, default: all rows)
+        whose pair is not in `pairs` ({company: cp_ids}): former customers,
+        companies a shared customer no longer trades in, rows scored in
+        another company before. Keeps the table in line with the view.
+        """
+        company_ids, cp_ids = [], []
+        for company, company_cp_ids in pairs.items():
+            company_ids.extend([company.id] * len(company_cp_ids))
+            cp_ids.extend(company_cp_ids)
+        self.flush_model()
+        self.env.cr.execute(SQL(
+            """
+            DELETE FROM %(table)s
+             WHERE %(scope)s
+               AND (company_id, commercial_partner_id) NOT IN (
+                   SELECT * FROM unnest(%(company_ids)s::int[], %(cp_ids)s::int[]))
+            """,
+            table=SQL.identifier(self._table),
+            scope=(
+                SQL("TRUE") if commercial_partner_ids is None
+                else SQL("commercial_partner_id = ANY(%s)", list(commercial_partner_ids))
+            ),
+            company_ids=company_ids,
+            cp_ids=cp_ids,
+        ))
+        self.invalidate_model()
+
+    @api.model
+    def _customer_entity_domain(self, commercial_partner_ids=None):
         """
-        if partners is None:
-            partners = self.env["res.partner"].search([("customer_rank", ">", 0)])
+        res.partner domain of the commercial entities having at least one
+        customer contact (optionally restricted to `commercial_partner_ids`):
+        a company with many contacts is one record, so it is scored once.
+        """
+        domain = [("customer_rank", ">", 0)]
+        if commercial_partner_ids is not None:
+            domain.append(("commercial_partner_id", "in", list(commercial_partner_ids)))
+        query = self.env["res.partner"]._search(domain)
+        return [("id", "in", query.subselect(SQL.identifier(query.table, "commercial_partner_id")))]
+
+    @api.model
+    def _customer_pairs(self, partners=None):
+        """
+        Return {company: set(commercial_partner_ids)} for the customers to refresh.
+        Customers bound to a company are scored in that company; shared
+        customers (no company) get one row per company where they have posted
+        invoices/credit notes or confirmed orders, or the first company (lowest
+        id) if they have no activity at all, as res.partner._risk_home_companies.
+        """
+        pairs = defaultdict(set)
+        shared_cp_ids = set()
+        # Paired from the customer contacts, as a full refresh does, so that
+        # a partial refresh never drops a row of the full pairing
+        domain = [("customer_rank", ">", 0)]
+        if partners is not None:
+            domain.append(("commercial_partner_id", "in", partners.commercial_partner_id.ids))
+        groups = self.env["res.partner"]._read_group(domain, ["company_id", "commercial_partner_id"])
+        for company, cp in groups:
+            if company:
+                pairs[company].add(cp.id)
+            else:
+                shared_cp_ids.add(cp.id)
 
+        if shared_cp_ids:
+            active = self._shared_customer_companies(shared_cp_ids)
+            first_company = self.env["res.company"].sudo().search([], order="id", limit=1)
+            for cp_id in shared_cp_ids:
+                for company in active.get(cp_id) or [first_company]:
+                    pairs[company].add(cp_id)
+        return pairs
+
+    @api.model
+    def _shared_customer_companies(self, commercial_partner_ids):
+        """Companies in which each shared customer has activity: {cp_id: [company]}."""
         Move = self.env["account.move"].sudo()
         Sale = self.env["sale.order"].sudo()
-        now_dt = fields.Datetime.now()
+        active = defaultdict(set)
+        move_groups = Move._read_group(
+            [
+                ("commercial_partner_id", "in", list(commercial_partner_ids)),
+                ("move_type", "in", ("out_invoice", "out_refund")),
+                ("state", "=", "posted"),
+            ],
+            ["company_id", "commercial_partner_id"],
+        )
+        for company, cp in move_groups:
+            active[cp.id].add(company)
+        order_groups = Sale._read_group(
+            [
+                ("pv_commercial_partner_id", "in", list(commercial_partner_ids)),
+                ("state", "in", ("sale", "done")),
+            ],
+            ["company_id", "pv_commercial_partner_id"],
+        )
+        for company, cp in order_groups:
+            active[cp.id].add(company)
+        return {cp_id: list(companies) for cp_id, companies in active.items()}
 
-        for partner in partners:
-            company = partner.company_id or self.env.company
-            cp = partner.commercial_partner_id
-            today = fields.Date.context_today(partner)
+    @api.model
+    def _compute_rows(self, company, commercial_partner_ids, now_dt):
+        """Compute KPI row values for the given commercial partners of one company."""
+        Partner = self.env["res.partner"]
+        today = fields.Date.context_today(self)
 
-            # Window for orders_in_window
-            window_days = self._get_window_days_for_company(partner, company)
-            date_from_dt = now_dt - timedelta(days=window_days)
+        config = Partner._get_risk_config(company)
+        window_days = self._get_window_days_for_company(Partner, company)
+        # Same exposure layer as the partner snapshot (receivables, aging, orders)
+        aggregates = Partner._risk_aggregate_batch(
+            company, commercial_partner_ids, today, now_dt - timedelta(days=window_days),
+        )
 
-            # ---- Open posted invoices (denominator & overdue) ----
-            inv_domain = [
-                ("company_id", "=", company.id),
-                ("partner_id.commercial_partner_id", "=", cp.id),
-                ("move_type", "=", "out_invoice"),
-                ("state", "=", "posted"),
-                ("amount_residual", ">", 0),
-            ]
-            invoices = Move.with_company(company).search(inv_domain)
-            inv_outstanding = sum(m.amount_residual for m in invoices) or 0.0
-            inv_overdue = sum(
-                m.amount_residual
-                for m in invoices
-                if m.invoice_date_due and m.invoice_date_due < today
-            ) or 0.0
-
-            # ---- Open posted credit notes (to offset overdue) ----
-            cr_domain = [
-                ("company_id", "=", company.id),
-                ("partner_id.commercial_partner_id", "=", cp.id),
-                ("move_type", "=", "out_refund"),
-                ("state", "=", "posted"),
-                ("amount_residual", ">", 0),
-            ]
-            credits = Move.with_company(company).search(cr_domain)
-            credit_open = sum(m.amount_residual for m in credits) or 0.0
-
-            # ---- Orders in window ----
-            orders_in_window = Sale.with_company(company).search_count(
-                [
-                    ("company_id", "=", company.id),
-                    ("partner_id.commercial_partner_id", "=", cp.id),
-                    ("state", "in", ("sale", "done")),
-                    ("date_order", ">=", date_from_dt),
-                ]
-            )
+        cps = Partner.sudo().browse(sorted(commercial_partner_ids)).with_company(company)
+        aggs = [aggregates.get((company.id, cp.id), {}) for cp in cps]
+        outstanding = [agg.get("outstanding", 0.0) for agg in aggs]
+        overdue = [agg.get("overdue", 0.0) for agg in aggs]
+        credit_open = [agg.get("credit_open", 0.0) for agg in aggs]
+        orders_in_window = [agg.get("orders_in_window", 0) for agg in aggs]
+        credit_limit = [self._get_credit_limit_for_partner(cp, company) for cp in cps]
+        credit_util_pct, overdue_ratio, scores, levels = Partner._risk_score_batch(
+            config, outstanding, overdue, credit_open, orders_in_window, credit_limit,
+            Partner._risk_pending_exposure(config, aggs),
+        )
 
-            # ---- Credit limit & utilization ----
-            credit_limit = self._get_credit_limit_for_partner(partner, company)
-            # Utilization uses net exposure (invoices minus open credits) bounded at >= 0
-            net_exposure = max(inv_outstanding - credit_open, 0.0)
-            credit_util_pct = (net_exposure / credit_limit * 100.0) if credit_limit else 0.0
-
-            # ---- Overdue ratio ----
-            overdue_effective = max(inv_overdue - credit_open, 0.0)
-            overdue_ratio = (overdue_effective / inv_outstanding) if inv_outstanding > 0 else 0.0
-
-            # ---- Risk score/level (reuse partner’s live compute output if available) ----
-            threshold_low, threshold_high = self._get_thresholds_for_company(partner, company)
-            score = partner.risk_score or 0
-            level = partner.risk_level or ("high" if score >= threshold_high else "medium" if score >= threshold_low else "low")
-
-            # upsert
-            rec = self.search(
-                [("company_id", "=", company.id), ("commercial_partner_id", "=", cp.id)],
-                limit=1,
-            )
-            vals = {
+        return [
+            {
                 "company_id": company.id,
                 "commercial_partner_id": cp.id,
-                "outstanding": inv_outstanding,
-                "credit_open": credit_open,
-                "overdue": inv_overdue,
-                "credit_limit": credit_limit,
-                "credit_util_pct": credit_util_pct,
-                "overdue_ratio": overdue_ratio,
-                "orders_in_window": orders_in_window,
-                "risk_score": score,
-                "risk_level": level,
+                "outstanding": outstanding[i],
+                "credit_open": credit_open[i],
+                "overdue": overdue[i],
+                "credit_limit": credit_limit[i],
+                "credit_util_pct": credit_util_pct[i],
+                "overdue_ratio": overdue_ratio[i],
+                "orders_in_window": orders_in_window[i],
+                "risk_score": scores[i],
+                "risk_level": levels[i],
                 "last_updated": now_dt,
+                **{key: aggs[i].get(key, 0.0) for key in _AGING_COLUMNS + _PENDING_COLUMNS},
             }
-            if rec:
-                rec.write(vals)
-            else:
-                self.create(vals)
+            for i, cp in enumerate(cps)
+        ]
+
+    # -------- Parallel refresh --------
+    @api.model
+    def _refresh_workers(self):
+        """
+        Number of refresh threads. Parallel workers commit on their own
+        cursors, so they are only used from crons (which commit per chunk
+        anyway); interactive refreshes run in the request transaction.
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        try:
+            workers = int(ICP.get_param("pv_sale_customer_risk.kpi_refresh_workers", 1))
+        except (TypeError, ValueError):
+            workers = 1
+        # Worker cursors cannot see the test transaction
+        if self.env.registry.in_test_mode() or not self.env.context.get("cron_id"):
+            return 1
+        return max(1, workers)
+
+    @api.model
+    def _refresh_chunk(self, company_id, commercial_partner_ids, now_dt):
+        company = self.env["res.company"].browse(company_id)
+        self._upsert_rows(self._compute_rows(company, commercial_partner_ids, now_dt))
+
+    def _refresh_chunk_in_new_cursor(self, company_id, commercial_partner_ids, now_dt):
+        """Worker body: own cursor and environment, committed on success."""
+        with self.env.registry.cursor() as cr:
+            env = api.Environment(cr, self.env.uid, self.env.context)
+            env[self._name]._refresh_chunk(company_id, commercial_partner_ids, now_dt)
+
+    # -------- Public APIs --------
+    @api.model
+    def action_refresh_from_partners(self, partners=None):
+        """
+        Refresh KPI rows for given partners; if None, refresh all commercial customers.
+        Calculates (from open receivable journal items, company currency):
+          - outstanding = sum open debit residuals (invoices, installments)
+          - credit_open = sum open credit residuals (credit notes, unreconciled payments)
+          - overdue = sum open debit residuals past due
+          - overdue_ratio = max(0, (overdue - credit_open)) / outstanding   (if outstanding > 0)
+          - to_invoice / draft_invoiced = exposure not posted yet, added to
+            outstanding in credit_util_pct (drafts only when enabled)
+        Work is split in (company, customer chunk) tasks: aggregates are computed
+        per task in a few grouped queries and rows are written with a bulk
+        INSERT ... ON CONFLICT. With pv_sale_customer_risk.kpi_refresh_workers > 1
+        and when run by a cron, the tasks run in a thread pool (see
+        _run_refresh_tasks); otherwise rows are written in the caller's
+        transaction and roll back with it.
+        """
+        now_dt = fields.Datetime.now()
+        chunk_size = self._pv_cron_batch_size()
+        pairs = self._customer_pairs(partners)
+        tasks = [
+            (company.id, chunk, now_dt)
+            for company, cp_ids in pairs.items()
+            for chunk in split_every(chunk_size, sorted(cp_ids), list)
+        ]
+        partner_count = sum(len(cp_ids) for _company_id, cp_ids, _now in tasks)
+        with self.env["pv.risk.perf.log"]._measure("debtor_kpi_refresh", partner_count):
+            # Rows of the refreshed customers that are no longer paired
+            scope = None if partners is None else set().union(*pairs.values())
+            self._delete_stale_rows(pairs, scope)
+            self._run_refresh_tasks(tasks)
+        return True
+
+    @api.model
+    def _run_refresh_tasks(self, tasks):
+        """
+        Run (company_id, cp_ids, now_dt) refresh tasks, in a thread pool when
+        several workers are configured (cron only, see _refresh_workers).
+        Each worker commits its task on its own cursor: they only see data
+        committed before the run, a failed task leaves the others committed
+        (the cron's next run redoes it), and their queries are not counted by
+        the perf log of the calling thread.
+        """
+        workers = min(self._refresh_workers(), len(tasks))
+        if workers <= 1:
+            for task in tasks:
+                self._refresh_chunk(*task)
+            return
+
+        # Workers read committed data and commit their own rows
+        self.env.flush_all()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pv_debtor_kpi") as pool:
+            for future in [pool.submit(self._refresh_chunk_in_new_cursor, *task) for task in tasks]:
+                future.result()
+        self.invalidate_model()
+
+    # -------- Delta refresh --------
+    @api.model
+    def _get_high_water_mark(self):
+        ICP = self.env["ir.config_parameter"].sudo()
+        value = ICP.get_param(KPI_HIGH_WATER_MARK_PARAM)
+        try:
+            return fields.Datetime.to_datetime(value) if value else None
+        except ValueError:
+            return None
+
+    @api.model
+    def _set_high_water_mark(self, value):
+        ICP = self.env["ir.config_parameter"].sudo()
+        ICP.set_param(KPI_HIGH_WATER_MARK_PARAM, fields.Datetime.to_string(value))
+
+    @api.model
+    def _next_high_water_mark(self):
+        """
+        Mark to record for a run starting now. write_date is the start time of
+        the writing transaction, so a transaction still running when the scan
+        starts may commit rows dated before "now": the mark is the start of the
+        oldest running transaction of the database (this one included), minus
+        KPI_HIGH_WATER_MARK_OVERLAP, and the next run re-scans from there.
+        """
+        self.env.cr.execute(SQL(
+            """
+            SELECT LEAST(now(), MIN(xact_start)) AT TIME ZONE 'UTC'
+              FROM pg_stat_activity
+             WHERE datname = current_database()
+            """
+        ))
+        return self.env.cr.fetchone()[0] - KPI_HIGH_WATER_MARK_OVERLAP
+
+    @api.model
+    def _delta_commercial_partner_ids(self, since, now_dt):
+        """
+        Commercial partners whose KPIs may have changed since `since`:
+          - journal entries written (invoices, credit notes, payments: posted,
+            paid, reversed, reset)
+          - sale orders written (confirmed, cancelled)
+          - open receivable items that became overdue since the last run
+          - confirmed orders that left the activity window since the last run
+        """
+        Partner = self.env["res.partner"]
+        Move = self.env["account.move"].sudo()
+        MoveLine = self.env["account.move.line"].sudo()
+        Sale = self.env["sale.order"].sudo()
+        today = fields.Date.context_today(self)
+        cp_ids = set()
+
+        move_groups = Move._read_group(
+            [("write_date", ">", since), ("commercial_partner_id", "!=", False)],
+            ["commercial_partner_id"],
+        )
+        cp_ids.update(cp.id for [cp] in move_groups)
+
+        overdue_groups = MoveLine._read_group(
+            [
+                ("account_id.account_type", "=", "asset_receivable"),
+                ("parent_state", "=", "posted"),
+                ("reconciled", "=", False),
+                ("amount_residual", ">", 0),
+                ("date_maturity", ">=", fields.Date.to_date(since)),
+                ("date_maturity", "<", today),
+            ],
+            ["partner_id"],
+        )
+        cp_ids.update(cp.id for [cp] in overdue_groups)
+
+        # Orders touched since the last run, or sliding out of any company window
+        windows = [
+            self._get_window_days_for_company(Partner, company)
+            for company in self.env["res.company"].sudo().search([])
+        ]
+        order_groups = Sale._read_group(
+            [
+                "|",
+                ("write_date", ">", since),
+                "&",
+                ("state", "in", ("sale", "done")),
+                "&",
+                ("date_order", ">=", since - timedelta(days=max(windows))),
+                ("date_order", "<", now_dt - timedelta(days=min(windows))),
+            ],
+            ["pv_commercial_partner_id"],
+        )
+        cp_ids.update(cp.id for [cp] in order_groups)
+
+        # Customers are not scanned by write_date: every snapshot recompute
+        # bumps it. Their KPI-relevant changes (credit limit, company,
+        # hierarchy) go through pv.risk.dirty.partner (res.partner.write).
 
+        cp_ids.discard(False)
+        return cp_ids
+
+    @api.model
+    def action_refresh_delta(self):
+        """
+        Refresh only the customers touched since the last recorded run.
+        Falls back to a full rebuild when no high-water mark exists yet.
+        """
+        risk_cache.rate_cache.clear()
+        now_dt = fields.Datetime.now()
+        mark = self._next_high_water_mark()
+        since = self._get_high_water_mark()
+        if not since:
+            return self.action_refresh_full()
+
+        cp_ids = self._delta_commercial_partner_ids(since, now_dt)
+        if cp_ids:
+            partners = self.env["res.partner"].search(self._customer_entity_domain(cp_ids))
+            self.action_refresh_from_partners(partners)
+        self._set_high_water_mark(mark)
         return True
 
     @api.model
-    def cron_refresh_all(self):
-        """Cron entry point – refresh all commercial customers."""
+    def action_refresh_full(self):
+        """Rebuild every KPI row and reset the delta high-water mark."""
+        risk_cache.rate_cache.clear()
+        mark = self._next_high_water_mark()
         self.action_refresh_from_partners(None)
+        self._set_high_water_mark(mark)
+        return True
+
+    @api.model
+    def action_open_debtors(self):
+        """Debtors menu: open the KPI of the active backend."""
+        if self._kpi_backend() == "matview":
+            return self.env["ir.actions.act_window"]._for_xml_id("pv_sale_customer_risk_score.action_pv_debtor_kpi_view")
+        return self.env["ir.actions.act_window"]._for_xml_id("pv_sale_customer_risk_score.action_pv_debtor_kpi")
+
+    @api.model
+    def action_schedule_full_refresh(self):
+        """Queue a full rebuild on the (chunked) cron instead of running it inline."""
+        cursor = self.env["pv.risk.cron.cursor"]._get(KPI_CRON_JOB)
+        cursor.write({"last_id": 0, "run_started": self._next_high_water_mark(), "full_run": True})
+        self.env.ref("pv_sale_customer_risk_score.ir_cron_pv_debtor_kpi_refresh").sudo()._trigger()
+        return True
+
+    @api.model
+    def cron_refresh_all(self, full=False):
+        """
+        Cron entry point – delta refresh, or a full rebuild when `full` is set
+        or no high-water mark exists yet. Customers are processed in chunks and
+        an interrupted run resumes where it stopped; the high-water mark only
+        advances once the whole run is done.
+        With the materialized view backend the view is refreshed instead.
+        """
+        risk_cache.rate_cache.clear()
+        if self._kpi_backend() == "matview":
+            return self.env["pv.debtor.kpi.view"]._refresh_view()
+
+        cursor = self.env["pv.risk.cron.cursor"]._get(KPI_CRON_JOB)
+        if not cursor.run_started:
+            since = self._get_high_water_mark()
+            cursor.write({
+                "last_id": 0,
+                "run_started": self._next_high_water_mark(),
+                "full_run": full or not since,
+            })
+
+        # Chunks of commercial entities: contacts of one company never land
+        # in different chunks, so each entity is scored once per run
+        cp_ids = None
+        if not cursor.full_run:
+            cp_ids = self._delta_commercial_partner_ids(self._get_high_water_mark(), cursor.run_started)
+        domain = self._customer_entity_domain(cp_ids)
+
+        if self._pv_run_chunked(cursor, "res.partner", domain, self.action_refresh_from_partners):
+            if cursor.full_run:
+                # Chunks only clean up their own customers: drop former ones
+                entities = self.env["res.partner"]._search(domain)
+                self.sudo().search([("commercial_partner_id", "not in", entities)]).unlink()
+            self._set_high_water_mark(cursor.run_started)
+            cursor.write({"run_started": False, "full_run": False})
         return True
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+# Columns copied from a KPI row into its history point
+_HISTORY_COLUMNS = (
+    "company_id",
+    "commercial_partner_id",
+    "outstanding",
+    "credit_open",
+    "overdue",
+    "credit_util_pct",
+    "overdue_ratio",
+    "orders_in_window",
+    "risk_score",
+    "risk_level",
+)
+HISTORY_CHUNK_SIZE = 1000
+# Daily points are kept this long, then rolled up to one point per month
+HISTORY_DAILY_RETENTION_DAYS = 90
+
+
+class PvDebtorKpiHistory(models.Model):
+    _name = "pv.debtor.kpi.history"
+    _description = "Debtor KPI History"
+    _order = "company_id, commercial_partner_id, date"
+    _log_access = False
+
+    date = fields.Date(required=True)
+    granularity = fields.Selection(
+        [("day", "Daily"), ("month", "Monthly")],
+        required=True,
+        default="day",
+    )
+    company_id = fields.Many2one("res.company", required=True, ondelete="cascade")
+    commercial_partner_id = fields.Many2one(
+        "res.partner", string="Customer", required=True, ondelete="cascade"
+    )
+
+    outstanding = fields.Float(string="Outstanding (Invoices)", digits=(16, 2))
+    credit_open = fields.Float(string="Credit Open", digits=(16, 2))
+    overdue = fields.Float(string="Overdue (Invoices)", digits=(16, 2))
+    credit_util_pct = fields.Float(string="Credit Util %", digits=(16, 2))
+    overdue_ratio = fields.Float(string="Overdue Ratio", digits=(16, 4))
+    orders_in_window = fields.Integer(string="Orders in Window")
+    risk_score = fields.Integer(string="Risk Score")
+    risk_level = fields.Selection(
+        [("low", "Low"), ("medium", "Medium"), ("high", "High")],
+        string="Risk Level",
+    )
+
+    # The unique index doubles as the (company, partner, date) lookup index
+    _sql_constraints = [
+        (
+            "uniq_company_partner_date",
+            "unique(company_id, commercial_partner_id, date)",
+            "One history point per customer per company and day.",
+        )
+    ]
+
+    @api.model
+    def _record_rows(self, rows, date=None):
+        """
+        Append one point per KPI row for `date` (today by default) in bulk.
+        A second refresh on the same day overwrites that day's point.
+        """
+        if not rows:
+            return
+        date = date or fields.Date.context_today(self)
+        self.flush_model()
+        columns = _HISTORY_COLUMNS + ("date", "granularity")
+        for offset in range(0, len(rows), HISTORY_CHUNK_SIZE):
+            chunk = rows[offset:offset + HISTORY_CHUNK_SIZE]
+            values = SQL(", ").join(
+                SQL("%s", tuple(row[c] for c in _HISTORY_COLUMNS) + (date, "day"))
+                for row in chunk
+            )
+            self.env.cr.execute(SQL(
+                """
+                INSERT INTO %s (%s) VALUES %s
+                ON CONFLICT (company_id, commercial_partner_id, date) DO UPDATE SET %s
+                """,
+                SQL.identifier(self._table),
+                SQL(", ").join(SQL.identifier(c) for c in columns),
+                values,
+                SQL(", ").join(
+                    SQL("%s = EXCLUDED.%s", SQL.identifier(c), SQL.identifier(c))
+                    for c in _HISTORY_COLUMNS[2:]
+                ),
+            ))
+        self.invalidate_model()
+
+    @api.model
+    def cron_compact_history(self):
+        """
+        Retention: keep daily points for HISTORY_DAILY_RETENTION_DAYS, then only
+        the latest point of each calendar month (flagged as monthly).
+        """
+        cutoff = fields.Date.context_today(self) - relativedelta(days=HISTORY_DAILY_RETENTION_DAYS)
+        self.flush_model()
+        self.env.cr.execute(SQL(
+            """
+            DELETE FROM %(table)s h
+             USING (
+                SELECT id,
+                       row_number() OVER (
+                           PARTITION BY company_id, commercial_partner_id, date_trunc('month', date)
+                           ORDER BY date DESC
+                       ) AS rn
+                  FROM %(table)s
+                 WHERE date < %(cutoff)s
+             ) ranked
+             WHERE h.id = ranked.id AND ranked.rn > 1
+            """,
+            table=SQL.identifier(self._table),
+            cutoff=cutoff,
+        ))
+        self.env.cr.execute(SQL(
+            "UPDATE %s SET granularity = 'month' WHERE granularity = 'day' AND date < %s",
+            SQL.identifier(self._table),
+            cutoff,
+        ))
+        self.invalidate_model()
+        return True
+
+    @api.model
+    def get_series(self, partner_id, company_id=None, date_from=None):
+        """
+        Time series of a customer's KPIs for charts, oldest first, in one query.
+        Returns a list of dicts (date, granularity and the KPI columns).
+        """
+        self.check_access("read")
+        company_id = company_id or self.env.company.id
+        conditions = [
+            SQL("commercial_partner_id = %s", partner_id),
+            SQL("company_id = %s", company_id),
+        ]
+        if date_from:
+            conditions.append(SQL("date >= %s", date_from))
+        self.flush_model()
+        self.env.cr.execute(SQL(
+            """
+            SELECT date, granularity, outstanding, credit_open, overdue, credit_util_pct,
+                   overdue_ratio, orders_in_window, risk_score, risk_level
+              FROM %s
+             WHERE %s
+             ORDER BY date
+            """,
+            SQL.identifier(self._table),
+            SQL(" AND ").join(conditions),
+        ))
+        return self.env.cr.dictfetchall()
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+from odoo.tools import SQL
+
+from ..tools.risk_scoring import CREDIT_UTIL_BANDS, OVERDUE_RATIO_BANDS
+from .res_partner import DSO_PERIOD_DAYS
+
+# Stable record id of a view row: commercial_partner_id * factor + company_id
+KPI_VIEW_ID_FACTOR = 100000
+
+
+def _float(value):
+    return SQL("%s::float8", float(value))
+
+
+def _band_sql(value, bands):
+    """SQL twin of risk_scoring._band: share of the first band strictly exceeded."""
+    return SQL(
+        "CASE %s ELSE 0.0::float8 END",
+        SQL(" ").join(
+            SQL("WHEN %s > %s THEN %s", value, _float(cut_off), _float(share))
+            for cut_off, share in bands
+        ),
+    )
+
+
+class PvDebtorKpiView(models.Model):
+    """
+    Materialized view backend of the Debtor KPI (see pv.debtor.kpi.mixin,
+    kpi_backend setting). Rows are computed entirely in PostgreSQL with the
+    same receivable query, customer/company pairing and scoring rules as the
+    pv.debtor.kpi refresh, and refreshed CONCURRENTLY by the KPI cron so the
+    list and pivot views are never blocked.
+
+    The company risk configuration is baked into the view definition: the
+    view is rebuilt when the settings are saved. "Today" is the UTC date.
+    """
+
+    _name = "pv.debtor.kpi.view"
+    _inherit = ["pv.debtor.kpi.mixin"]
+    _description = "Debtor KPI (Materialized View)"
+    _order = "company_id, overdue_ratio desc, outstanding desc"
+    _auto = False
+
+    def init(self):
+        # The view always exists so the registry finds a relation; it is only
+        # populated while it is the active backend.
+        self._create_view(with_data=self._kpi_backend() == "matview")
+
+    @api.model
+    def _config_sql(self):
+        """One row of risk configuration per company."""
+        Partner = self.env["res.partner"]
+        field = self._credit_limit_field()
+        rows = []
+        for company in self.env["res.company"].sudo().search([]):
+            config = Partner._get_risk_config(company)
+            # Value of a partner without a company-specific limit
+            default_limit = config.default_credit_limit if not field else 0.0
+            if field and field.company_dependent:
+                default_limit = field.get_company_dependent_fallback(Partner.with_company(company)) or 0.0
+            rows.append(SQL(
+                "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                company.id,
+                int(config.window_days),
+                _float(config.threshold_low),
+                _float(config.threshold_high),
+                _float(config.weight_credit or 0),
+                _float(config.weight_overdue or 0),
+                _float(config.weight_activity or 0),
+                _float(config.target_orders or 0),
+                _float(default_limit),
+                bool(config.include_draft_invoices),
+            ))
+        return SQL(
+            """
+            SELECT * FROM (VALUES %s) AS c(
+                company_id, window_days, threshold_low, threshold_high,
+                weight_credit, weight_overdue, weight_activity, target_orders,
+                default_credit_limit, include_draft_invoices
+            )
+            """,
+            SQL(", ").join(rows),
+        )
+
+    @api.model
+    def _credit_limit_field(self):
+        """Partner field holding the credit limit, as in res.partner._get_partner_credit_limit."""
+        fields_ = self.env["res.partner"]._fields
+        return fields_.get("credit_limit") or fields_.get("property_credit_limit")
+
+    @api.model
+    def _credit_limit_sql(self):
+        """Credit limit of `cp` in the company of `pairs` (see _get_partner_credit_limit)."""
+        field = self._credit_limit_field()
+        if not field:
+            return SQL("c.default_credit_limit")
+        if field.company_dependent:
+            return SQL(
+                "COALESCE((cp.%s ->> pairs.company_id::text)::float8, c.default_credit_limit)",
+                SQL.identifier(field.name),
+            )
+        return SQL("COALESCE(cp.%s, 0.0)::float8", SQL.identifier(field.name))
+
+    @api.model
+    def _view_query(self):
+        """SELECT computing every KPI row (same rules as pv.debtor.kpi._compute_rows)."""
+        Partner = self.env["res.partner"]
+        today = SQL("(now() AT TIME ZONE 'UTC')::date")
+        receivables = Partner._risk_receivable_query(
+            today, SQL("%s - %s", today, DSO_PERIOD_DAYS), SQL("TRUE"), SQL("TRUE"),
+        )
+        return SQL(
+            """
+            WITH config AS (%(config)s),
+            customers AS (
+                SELECT p.company_id, p.commercial_partner_id
+                  FROM res_partner p
+                 WHERE p.active AND p.customer_rank > 0
+            ),
+            shared_activity AS (
+                SELECT m.company_id, m.commercial_partner_id
+                  FROM account_move m
+                 WHERE m.state = 'posted' AND m.move_type IN ('out_invoice', 'out_refund')
+                UNION
+                SELECT so.company_id, so.pv_commercial_partner_id
+                  FROM sale_order so
+                 WHERE so.state IN ('sale', 'done')
+            ),
+            pairs AS (
+                SELECT company_id, commercial_partner_id
+                  FROM customers
+                 WHERE company_id IS NOT NULL
+                UNION
+                SELECT COALESCE(a.company_id, %(fallback_company)s), s.commercial_partner_id
+                  FROM (SELECT DISTINCT commercial_partner_id FROM customers WHERE company_id IS NULL) s
+                  LEFT JOIN shared_activity a ON a.commercial_partner_id = s.commercial_partner_id
+            ),
+            receivables AS (%(receivables)s),
+            -- Conversion rates as in res.currency._get_rates (root company rates win)
+            rates AS (
+                SELECT comp.id AS company_id,
+                       cur.id AS currency_id,
+                       COALESCE(
+                           (SELECT r.rate FROM res_currency_rate r
+                             WHERE r.currency_id = cur.id
+                               AND r.name <= %(today)s
+                               AND (r.company_id IS NULL OR r.company_id = split_part(comp.parent_path, '/', 1)::integer)
+                             ORDER BY r.company_id, r.name DESC LIMIT 1),
+                           (SELECT r.rate FROM res_currency_rate r
+                             WHERE r.currency_id = cur.id
+                               AND (r.company_id IS NULL OR r.company_id = split_part(comp.parent_path, '/', 1)::integer)
+                             ORDER BY r.company_id, r.name ASC LIMIT 1),
+                           1.0
+                       ) AS rate
+                  FROM res_company comp
+                 CROSS JOIN res_currency cur
+            ),
+            order_exposure AS (
+                SELECT r.company_id,
+                       r.commercial_partner_id,
+                       SUM(ROUND(
+                           e.value::numeric * (to_rate.rate / from_rate.rate),
+                           company_currency.decimal_places
+                       ))::float8 AS to_invoice
+                  FROM receivables r
+                 CROSS JOIN LATERAL jsonb_each_text(r.to_invoice_by_currency) e
+                  JOIN res_company comp ON comp.id = r.company_id
+                  JOIN res_currency company_currency ON company_currency.id = comp.currency_id
+                  JOIN rates from_rate
+                    ON from_rate.company_id = r.company_id AND from_rate.currency_id = e.key::integer
+                  JOIN rates to_rate
+                    ON to_rate.company_id = r.company_id AND to_rate.currency_id = comp.currency_id
+                 GROUP BY r.company_id, r.commercial_partner_id
+            ),
+            orders AS (
+                SELECT so.company_id, so.pv_commercial_partner_id AS commercial_partner_id,
+                       COUNT(*) AS orders_in_window
+                  FROM sale_order so
+                  JOIN config c ON c.company_id = so.company_id
+                 WHERE so.state IN ('sale', 'done')
+                   AND so.date_order >= (now() AT TIME ZONE 'UTC') - make_interval(days => c.window_days)
+                 GROUP BY so.company_id, so.pv_commercial_partner_id
+            ),
+            amounts AS (
+                SELECT pairs.company_id,
+                       pairs.commercial_partner_id,
+                       c.window_days, c.threshold_low, c.threshold_high, c.weight_credit,
+                       c.weight_overdue, c.weight_activity, c.target_orders, c.include_draft_invoices,
+                       COALESCE(r.outstanding, 0)::float8 AS outstanding,
+                       COALESCE(r.overdue, 0)::float8 AS overdue,
+                       COALESCE(r.credit_open, 0)::float8 AS credit_open,
+                       COALESCE(r.aging_current, 0)::float8 AS aging_current,
+                       COALESCE(r.aging_0_30, 0)::float8 AS aging_0_30,
+                       COALESCE(r.aging_31_60, 0)::float8 AS aging_31_60,
+                       COALESCE(r.aging_61_90, 0)::float8 AS aging_61_90,
+                       COALESCE(r.aging_90_plus, 0)::float8 AS aging_90_plus,
+                       COALESCE(r.overdue_days_weighted, 0)::float8 AS overdue_days_weighted,
+                       COALESCE(r.sales_dso_period, 0)::float8 AS sales_dso_period,
+                       COALESCE(t.to_invoice, 0)::float8 AS to_invoice,
+                       COALESCE(r.draft_invoiced, 0)::float8 AS draft_invoiced,
+                       COALESCE(o.orders_in_window, 0)::integer AS orders_in_window,
+                       %(credit_limit)s AS credit_limit
+                  FROM pairs
+                  JOIN config c ON c.company_id = pairs.company_id
+                  JOIN res_partner cp ON cp.id = pairs.commercial_partner_id
+                  LEFT JOIN receivables r
+                         ON r.company_id = pairs.company_id
+                        AND r.commercial_partner_id = pairs.commercial_partner_id
+                  LEFT JOIN orders o
+                         ON o.company_id = pairs.company_id
+                        AND o.commercial_partner_id = pairs.commercial_partner_id
+                  LEFT JOIN order_exposure t
+                         ON t.company_id = pairs.company_id
+                        AND t.commercial_partner_id = pairs.commercial_partner_id
+            ),
+            pending AS (
+                SELECT a.*,
+                       a.to_invoice
+                       + CASE WHEN a.include_draft_invoices THEN a.draft_invoiced ELSE 0.0::float8 END AS pending
+                  FROM amounts a
+            ),
+            ratios AS (
+                SELECT a.*,
+                       CASE WHEN a.credit_limit > 0
+                            THEN GREATEST(0.0::float8, a.outstanding + a.pending - a.credit_open)
+                                 / a.credit_limit * 100.0::float8
+                            ELSE 0.0::float8 END AS credit_util_pct,
+                       CASE WHEN a.outstanding > 0
+                            THEN GREATEST(0.0::float8, a.overdue - a.credit_open) / a.outstanding
+                            ELSE 0.0::float8 END AS overdue_ratio,
+                       CASE WHEN a.target_orders > 0
+                            THEN GREATEST(0.0::float8, a.target_orders - a.orders_in_window) / a.target_orders
+                            ELSE 0.0::float8 END AS activity_share
+                  FROM pending a
+            ),
+            scores AS (
+                SELECT r.*,
+                       floor(
+                           r.weight_credit * %(credit_band)s
+                           + r.weight_overdue * %(overdue_band)s
+                           + r.weight_activity * r.activity_share
+                           + 0.5::float8
+                       )::integer AS risk_score
+                  FROM ratios r
+            )
+            SELECT s.commercial_partner_id::bigint * %(id_factor)s + s.company_id AS id,
+                   s.company_id,
+                   s.commercial_partner_id,
+                   s.outstanding,
+                   s.credit_open,
+                   s.overdue,
+                   s.credit_limit,
+                   s.credit_util_pct,
+                   s.overdue_ratio,
+                   s.orders_in_window,
+                   s.aging_current,
+                   s.aging_0_30,
+                   s.aging_31_60,
+                   s.aging_61_90,
+                   s.aging_90_plus,
+                   s.to_invoice,
+                   s.draft_invoiced,
+                   CASE WHEN s.sales_dso_period > 0
+                        THEN GREATEST(0.0::float8, s.outstanding - s.credit_open) / s.sales_dso_period * %(dso_days)s
+                        ELSE 0.0::float8 END AS dso,
+                   CASE WHEN s.overdue > 0
+                        THEN s.overdue_days_weighted / s.overdue
+                        ELSE 0.0::float8 END AS avg_days_overdue,
+                   s.risk_score,
+                   CASE WHEN s.risk_score >= s.threshold_high THEN 'high'
+                        WHEN s.risk_score >= s.threshold_low THEN 'medium'
+                        ELSE 'low' END AS risk_level,
+                   now() AT TIME ZONE 'UTC' AS last_updated
+              FROM scores s
+            """,
+            config=self._config_sql(),
+            today=today,
+            fallback_company=self.env["res.company"].sudo().search([], order="id", limit=1).id,
+            receivables=receivables,
+            credit_limit=self._credit_limit_sql(),
+            credit_band=_band_sql(SQL("r.credit_util_pct"), CREDIT_UTIL_BANDS),
+            overdue_band=_band_sql(SQL("r.overdue_ratio"), OVERDUE_RATIO_BANDS),
+            id_factor=KPI_VIEW_ID_FACTOR,
+            dso_days=_float(DSO_PERIOD_DAYS),
+        )
+
+    @api.model
+    def _create_view(self, with_data=True):
+        """(Re)create the materialized view and its unique index."""
+        self.env.flush_all()
+        table = SQL.identifier(self._table)
+        self.env.cr.execute(SQL("DROP MATERIALIZED VIEW IF EXISTS %s", table))
+        self.env.cr.execute(SQL(
+            "CREATE MATERIALIZED VIEW %s AS (%s) %s",
+            table,
+            self._view_query(),
+            SQL("WITH DATA") if with_data else SQL("WITH NO DATA"),
+        ))
+        # Required by REFRESH ... CONCURRENTLY
+        self.env.cr.execute(SQL(
+            "CREATE UNIQUE INDEX %s ON %s (company_id, commercial_partner_id)",
+            SQL.identifier("%s_company_partner_uniq" % self._table),
+            table,
+        ))
+        self.env.cr.execute(SQL(
+            "CREATE INDEX %s ON %s (id)",
+            SQL.identifier("%s_id_idx" % self._table),
+            table,
+        ))
+        self.invalidate_model()
+
+    @api.model
+    def _refresh_view(self):
+        """
+        Refresh the view. A populated view is refreshed CONCURRENTLY (readers
+        keep the previous rows meanwhile); an empty one needs a plain refresh.
+        """
+        self.env.flush_all()
+        self.env.cr.execute(SQL(
+            "SELECT relispopulated FROM pg_class WHERE oid = %s::regclass",
+            self._table,
+        ))
+        populated = self.env.cr.fetchone()[0]
+        self.env.cr.execute(SQL(
+            "REFRESH MATERIALIZED VIEW %s %s",
+            SQL("CONCURRENTLY") if populated else SQL(),
+            SQL.identifier(self._table),
+        ))
+        self.invalidate_model()
+        return True
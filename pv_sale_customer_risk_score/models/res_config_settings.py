@@ -2,6 +2,8 @@
 from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError
 
+from .res_partner import RISK_SCORING_PARAMS
+
 
 class ResConfigSettings(models.TransientModel):
     _inherit = 'res.config.settings'
@@ -42,24 +44,52 @@ class ResConfigSettings(models.TransientModel):
         company_dependent=True,
     )
 
+    risk_gate_max_age_minutes = fields.Integer(
+        string="Max risk snapshot age (minutes)",
+        default=360,
+        config_parameter="pv_sale_customer_risk.gate_max_age_minutes",
+        company_dependent=True,
+        help="Confirmation check: customers whose stored risk snapshot is older than this are recomputed live. 0 trusts the stored snapshot.",
+    )
+
+    # Exposure
+    risk_include_draft_invoices = fields.Boolean(
+        string="Count draft invoices in exposure",
+        default=False,
+        config_parameter="pv_sale_customer_risk.include_draft_invoices",
+        company_dependent=True,
+        help="Credit utilization always includes confirmed orders still to invoice; "
+             "enable to also count draft invoices and credit notes.",
+    )
+    risk_block_over_credit_limit = fields.Boolean(
+        string="Block confirmation over credit limit",
+        default=False,
+        config_parameter="pv_sale_customer_risk.block_over_credit_limit",
+        company_dependent=True,
+        help="Block confirmation when the customer's exposure plus the order exceeds the credit limit.",
+    )
+
     # Optional weights/targets (kept as integers)
     risk_weight_credit = fields.Integer(
         string="Weight: Credit Utilization",
         default=40,
         config_parameter="pv_sale_customer_risk.weight_credit",
         company_dependent=True,
+        help="Points added at full credit utilization band (> 100%); 2/3 above 80%, 1/3 above 50%.",
     )
     risk_weight_overdue = fields.Integer(
         string="Weight: Overdue Ratio",
         default=50,
         config_parameter="pv_sale_customer_risk.weight_overdue",
         company_dependent=True,
+        help="Points added when the overdue ratio exceeds 20%; 40% of it above 5%.",
     )
     risk_weight_activity = fields.Integer(
         string="Weight: Inactivity",
         default=10,
         config_parameter="pv_sale_customer_risk.weight_activity",
         company_dependent=True,
+        help="Points added in proportion to the shortfall of orders in the window against the target.",
     )
     risk_target_orders_in_window = fields.Integer(
         string="Target orders in window",
@@ -68,6 +98,25 @@ class ResConfigSettings(models.TransientModel):
         company_dependent=True,
     )
 
+    risk_kpi_backend = fields.Selection(
+        [
+            ('table', "Table (refreshed per customer)"),
+            ('matview', "Materialized view (refreshed concurrently)"),
+        ],
+        string="Debtor KPI storage",
+        default='table',
+        config_parameter="pv_sale_customer_risk.kpi_backend",
+        help="Materialized view: the Debtors KPIs are computed by PostgreSQL and refreshed "
+             "as a whole by the KPI cron without blocking readers.",
+    )
+
+    risk_perf_log = fields.Boolean(
+        string="Record risk performance logs",
+        config_parameter="pv_sale_customer_risk.perf_log",
+        help="Record wall time, query count and cache hits of the risk computations "
+             "(Accounting > Debtors > Performance Logs).",
+    )
+
     @api.constrains(
         'pv_risk_activity_window_days',
         'risk_low_threshold',
@@ -91,3 +140,41 @@ class ResConfigSettings(models.TransientModel):
                 and rec.risk_target_orders_in_window < 0
             ):
                 raise ValidationError(_("Target orders must be ≥ 0."))
+
+    @api.model
+    def _pv_kpi_view_config(self):
+        """Configuration baked into the Debtors materialized view, comparable."""
+        config = self.env['pv.debtor.kpi.view']._config_sql()
+        return config.code, config.params
+
+    @api.model
+    def _pv_risk_scoring_config(self):
+        """Scoring parameters of every company: {company_id: tuple}."""
+        Partner = self.env['res.partner']
+        return {
+            company.id: tuple(getattr(Partner._get_risk_config(company), name) for name in RISK_SCORING_PARAMS)
+            for company in self.env['res.company'].sudo().search([])
+        }
+
+    def set_values(self):
+        KpiView = self.env['pv.debtor.kpi.view']
+        backend_before = KpiView._kpi_backend()
+        view_config_before = self._pv_kpi_view_config()
+        scoring_before = self._pv_risk_scoring_config()
+        super().set_values()
+        # Drop the cached per-company risk configuration (res.partner._pv_risk_config)
+        self.env.registry.clear_cache()
+        # Stored levels and KPI rows follow the scoring parameters: recompute them in the background
+        if self._pv_risk_scoring_config() != scoring_before:
+            self.env['res.partner']._schedule_risk_recompute()
+            if KpiView._kpi_backend() == 'table':
+                self.env['pv.debtor.kpi'].action_schedule_full_refresh()
+        # DROP/CREATE locks out the Debtors readers: only rebuild the view when
+        # its definition changes (emptied when switched off); switching it on
+        # with an unchanged definition only needs a refresh.
+        backend = KpiView._kpi_backend()
+        switched_off = backend_before == 'matview' and backend != 'matview'
+        if switched_off or self._pv_kpi_view_config() != view_config_before:
+            KpiView._create_view(with_data=backend == 'matview')
+        elif backend == 'matview' and backend_before != 'matview':
+            KpiView._refresh_view()
@@ -1,39 +1,116 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict, namedtuple
 from datetime import timedelta
 
-from odoo import api, fields, models
+from odoo import api, fields, models, tools
+from odoo.tools import SQL, str2bool
+
+from ..tools import risk_cache, risk_scoring
+
+RISK_SNAPSHOT_FIELDS = (
+    'risk_credit_util_pct',
+    'risk_overdue_ratio',
+    'risk_orders_90d',
+    'risk_activity_window_days',
+    'risk_score',
+    'risk_level',
+    'risk_last_recomputed',
+)
+
+# Keys summed by _risk_receivable_aggregate (besides the derived dso / avg_days_overdue)
+RECEIVABLE_AGGREGATE_KEYS = (
+    'outstanding',
+    'overdue',
+    'credit_open',
+    'aging_current',
+    'aging_0_30',
+    'aging_31_60',
+    'aging_61_90',
+    'aging_90_plus',
+    'draft_invoiced',
+)
+# Period (days) of credit sales used for days-sales-outstanding
+DSO_PERIOD_DAYS = 90
+
+# Partner fields whose change alters the customer's Debtor KPI rows
+RISK_KPI_PARTNER_FIELDS = {
+    'credit_limit',
+    'property_credit_limit',
+    'parent_id',
+    'company_id',
+    'is_company',
+    'active',
+}
+
+# Per-company risk configuration (immutable: shared through ormcache)
+RiskConfig = namedtuple('RiskConfig', [
+    'window_days',
+    'threshold_low',
+    'threshold_high',
+    'weight_credit',
+    'weight_overdue',
+    'weight_activity',
+    'target_orders',
+    'warn_on_quote',
+    'block_on_high',
+    'default_credit_limit',
+    'gate_max_age_minutes',
+    'include_draft_invoices',
+    'block_over_credit_limit',
+])
+# RiskConfig fields the stored scores depend on
+RISK_SCORING_PARAMS = (
+    'window_days',
+    'threshold_low',
+    'threshold_high',
+    'weight_credit',
+    'weight_overdue',
+    'weight_activity',
+    'target_orders',
+    'default_credit_limit',
+    'include_draft_invoices',
+)
 
 
 class ResPartner(models.Model):
-    _inherit = 'res.partner'
+    _inherit = ['res.partner', 'pv.risk.cron.mixin']
 
-    # Snapshot fields shown on the Risk tab
+    # Snapshot fields shown on the Risk tab (stored, refreshed by @api.depends and the cron).
+    # Computed on commercial entities; contacts copy their entity's snapshot.
     risk_credit_util_pct = fields.Float(
         string="Credit Utilization %",
         compute="_compute_risk_snapshot",
-        store=False,
+        recursive=True,
+        store=True,
+        index=True,
         digits=(16, 2),
     )
     risk_overdue_ratio = fields.Float(
         string="Overdue Ratio",
         compute="_compute_risk_snapshot",
-        store=False,
+        recursive=True,
+        store=True,
+        index=True,
         digits=(16, 4),
     )
     risk_orders_90d = fields.Integer(
         string="Orders in Window",
         compute="_compute_risk_snapshot",
-        store=False,
+        recursive=True,
+        store=True,
     )
     risk_activity_window_days = fields.Integer(
         string="Activity Window (Days)",
         compute="_compute_risk_snapshot",
-        store=False,
+        recursive=True,
+        store=True,
     )
     risk_score = fields.Integer(
         string="Risk Score",
         compute="_compute_risk_snapshot",
-        store=False,
+        recursive=True,
+        store=True,
+        index=True,
     )
     risk_level = fields.Selection(
         [
@@ -43,38 +120,66 @@ class ResPartner(models.Model):
         ],
         string="Risk Level",
         compute="_compute_risk_snapshot",
-        store=False,
+        recursive=True,
+        store=True,
+        index=True,
     )
     risk_last_recomputed = fields.Datetime(
         string="Risk Last Recomputed",
         compute="_compute_risk_snapshot",
-        store=False,
+        recursive=True,
+        store=True,
         readonly=True,
     )
 
     # ------------------------------
     # Company configuration helpers
     # ------------------------------
+    @api.model
+    @tools.ormcache('company_id')
+    def _pv_risk_config(self, company_id):
+        """
+        Risk configuration of a company, loaded once per process and cached
+        until ir.config_parameter or the settings change (both clear the
+        registry cache). Accepts a company id; see _get_risk_config().
+        Keys written by the settings screen win over the legacy ones.
+        """
+        ICP = self.env['ir.config_parameter'].sudo().with_company(company_id)
+
+        def _param(keys, default, cast):
+            for key in keys:
+                val = ICP.get_param('pv_sale_customer_risk.%s' % key)
+                if val not in (None, False, ''):
+                    try:
+                        return cast(val)
+                    except Exception:
+                        break
+            return default
+
+        return RiskConfig(
+            window_days=_param(('activity_window_days', 'window_days'), 120, int),
+            threshold_low=_param(('low_threshold', 'threshold_low'), 30.0, float),
+            threshold_high=_param(('high_threshold', 'threshold_high'), 70.0, float),
+            weight_credit=_param(('weight_credit',), 40, int),
+            weight_overdue=_param(('weight_overdue',), 50, int),
+            weight_activity=_param(('weight_activity',), 10, int),
+            target_orders=_param(('target_orders_in_window',), 1, int),
+            warn_on_quote=_param(('warn_on_quote',), True, lambda v: bool(str2bool(v))),
+            block_on_high=_param(('block_sale_on_high',), False, lambda v: bool(str2bool(v))),
+            default_credit_limit=_param(('default_credit_limit',), 0.0, float),
+            gate_max_age_minutes=_param(('gate_max_age_minutes',), 360, int),
+            include_draft_invoices=_param(('include_draft_invoices',), False, lambda v: bool(str2bool(v))),
+            block_over_credit_limit=_param(('block_over_credit_limit',), False, lambda v: bool(str2bool(v))),
+        )
+
+    def _get_risk_config(self, company):
+        return self._pv_risk_config((company or self.env.company).id)
+
     def _get_activity_window_days_for_company(self, company):
-        ICP = self.env['ir.config_parameter'].sudo().with_company(company)
-        val = ICP.get_param('pv_sale_customer_risk.window_days', default='120')
-        try:
-            return int(val)
-        except Exception:
-            return 120
-
-    def _get_thresholds_for_company(self, company):
-        ICP = self.env['ir.config_parameter'].sudo().with_company(company)
-        low = ICP.get_param('pv_sale_customer_risk.threshold_low', default='30')
-        high = ICP.get_param('pv_sale_customer_risk.threshold_high', default='70')
-        try:
-            return float(low), float(high)
-        except Exception:
-            return 30.0, 70.0
+        return self._get_risk_config(company).window_days
 
     def _get_partner_credit_limit(self, company):
         partner = self.commercial_partner_id.with_company(company)
-        ICP = self.env['ir.config_parameter'].sudo().with_company(company)
 
         # Try common fields first; fall back to parameter
         if 'credit_limit' in partner._fields:
@@ -82,11 +187,292 @@ class ResPartner(models.Model):
         if 'property_credit_limit' in partner._fields:
             return float(partner.property_credit_limit or 0.0)
 
-        default_limit = ICP.get_param('pv_sale_customer_risk.default_credit_limit', default='0')
-        try:
-            return float(default_limit)
-        except Exception:
-            return 0.0
+        return self._get_risk_config(company).default_credit_limit
+
+    # ------------------------------
+    # Batched aggregates
+    # ------------------------------
+    @api.model
+    def _risk_aggregate_batch(self, companies, commercial_partner_ids, today, date_from_dt):
+        """
+        Aggregate the raw risk KPIs for many commercial partners at once.
+        Returns {(company_id, commercial_partner_id): {...}} with the exposure
+        keys of _risk_receivable_aggregate plus:
+          - orders_in_window = confirmed orders since date_from_dt
+        This is the single exposure layer used by the partner snapshot and the
+        Debtor KPI refresh. The number of queries does not depend on the size
+        of the batch.
+        """
+        receivables = self._risk_receivable_aggregate(companies, commercial_partner_ids, today)
+        orders = self._risk_orders_in_window_batch(companies, commercial_partner_ids, date_from_dt)
+        result = {}
+        for key in set(receivables) | set(orders):
+            vals = dict(receivables.get(key) or dict.fromkeys(RECEIVABLE_AGGREGATE_KEYS + ('to_invoice',), 0.0))
+            vals['orders_in_window'] = orders.get(key, 0)
+            result[key] = vals
+        return result
+
+    @api.model
+    def _risk_orders_in_window_batch(self, companies, commercial_partner_ids, date_from_dt):
+        """Confirmed orders since date_from_dt: {(company_id, commercial_partner_id): count}."""
+        Sale = self.env['sale.order'].sudo()
+        counts = defaultdict(int)
+        if not companies or not commercial_partner_ids:
+            return counts
+        so_domain = [
+            ('company_id', 'in', companies.ids),
+            ('pv_commercial_partner_id', 'in', list(commercial_partner_ids)),
+            ('state', 'in', ('sale', 'done')),
+            ('date_order', '>=', date_from_dt),
+        ]
+        for company, cp, count in Sale._read_group(so_domain, ['company_id', 'pv_commercial_partner_id'], ['__count']):
+            counts[company.id, cp.id] += count
+        return counts
+
+    @api.model
+    def _risk_receivable_query(self, today, dso_from, where, order_where):
+        """
+        SQL of the exposure aggregate grouped by (company_id, commercial_partner_id);
+        `today` / `dso_from` are dates or SQL expressions, `where` an SQL filter
+        on the journal items (alias l) and `order_where` on the confirmed orders
+        (alias so). Shared with the materialized
+        view backend of the Debtor KPI so both produce the same numbers.
+        """
+        # One branch per kind of item; the open items branch repeats the
+        # predicate of pv_account_move_line_open_partner_idx so it can use it
+        lines = SQL(
+            """
+            SELECT l.company_id,
+                   l.partner_id AS commercial_partner_id,
+                   l.move_id,
+                   l.reconciled,
+                   l.date,
+                   l.balance,
+                   l.amount_residual AS residual,
+                   l.parent_state = 'posted' AS posted,
+                   %(today)s - COALESCE(l.date_maturity, l.date) AS days_due
+              FROM account_move_line l
+              JOIN account_account a ON a.id = l.account_id
+             WHERE (%(where)s)
+               AND a.account_type = 'asset_receivable'
+            """,
+            today=today,
+            where=where,
+        )
+        return SQL(
+            """
+            WITH lines AS (
+                %(lines)s AND l.reconciled IS NOT TRUE AND l.parent_state = 'posted'
+                UNION ALL
+                %(lines)s AND l.reconciled AND l.parent_state = 'posted' AND l.date >= %(dso_from)s
+                UNION ALL
+                %(lines)s AND l.parent_state = 'draft'
+            ),
+            receivables AS (
+                SELECT l.company_id,
+                       l.commercial_partner_id,
+                       SUM(l.residual) FILTER (WHERE l.open_debit) AS outstanding,
+                       SUM(l.residual) FILTER (WHERE l.open_debit AND l.days_due > 0) AS overdue,
+                       -SUM(l.residual) FILTER (WHERE l.open_credit) AS credit_open,
+                       SUM(l.residual) FILTER (WHERE l.open_debit AND l.days_due <= 0) AS aging_current,
+                       SUM(l.residual) FILTER (WHERE l.open_debit AND l.days_due BETWEEN 1 AND 30) AS aging_0_30,
+                       SUM(l.residual) FILTER (WHERE l.open_debit AND l.days_due BETWEEN 31 AND 60) AS aging_31_60,
+                       SUM(l.residual) FILTER (WHERE l.open_debit AND l.days_due BETWEEN 61 AND 90) AS aging_61_90,
+                       SUM(l.residual) FILTER (WHERE l.open_debit AND l.days_due > 90) AS aging_90_plus,
+                       SUM(l.residual * l.days_due) FILTER (WHERE l.open_debit AND l.days_due > 0) AS overdue_days_weighted,
+                       SUM(l.balance) FILTER (
+                           WHERE l.posted AND l.date >= %(dso_from)s AND m.move_type IN ('out_invoice', 'out_refund')
+                       ) AS sales_dso_period,
+                       SUM(l.balance) FILTER (WHERE NOT l.posted) AS draft_invoiced
+                  FROM (
+                    SELECT *,
+                           (posted AND NOT reconciled AND residual > 0) AS open_debit,
+                           (posted AND NOT reconciled AND residual < 0) AS open_credit
+                      FROM lines
+                  ) l
+                  JOIN account_move m ON m.id = l.move_id
+                 GROUP BY l.company_id, l.commercial_partner_id
+            ),
+            -- Ordered quantities of confirmed orders not on any invoice yet (draft
+            -- invoices are draft_invoiced), taxes included, in order currency
+            to_invoice AS (
+                SELECT t.company_id,
+                       t.commercial_partner_id,
+                       jsonb_object_agg(t.currency_id, t.amount) AS to_invoice_by_currency
+                  FROM (
+                    SELECT so.company_id,
+                           so.pv_commercial_partner_id AS commercial_partner_id,
+                           so.currency_id,
+                           SUM(
+                               sol.price_total * (sol.product_uom_qty - sol.qty_invoiced) / sol.product_uom_qty
+                           ) AS amount
+                      FROM sale_order_line sol
+                      JOIN sale_order so ON so.id = sol.order_id
+                     WHERE %(order_where)s
+                       AND so.state IN ('sale', 'done')
+                       AND sol.display_type IS NULL
+                       AND sol.product_uom_qty > 0
+                       AND sol.product_uom_qty > sol.qty_invoiced
+                     GROUP BY so.company_id, so.pv_commercial_partner_id, so.currency_id
+                  ) t
+                 GROUP BY t.company_id, t.commercial_partner_id
+            )
+            SELECT COALESCE(r.company_id, t.company_id) AS company_id,
+                   COALESCE(r.commercial_partner_id, t.commercial_partner_id) AS commercial_partner_id,
+                   r.outstanding,
+                   r.overdue,
+                   r.credit_open,
+                   r.aging_current,
+                   r.aging_0_30,
+                   r.aging_31_60,
+                   r.aging_61_90,
+                   r.aging_90_plus,
+                   r.overdue_days_weighted,
+                   r.sales_dso_period,
+                   r.draft_invoiced,
+                   t.to_invoice_by_currency
+              FROM receivables r
+              FULL JOIN to_invoice t
+                     ON t.company_id = r.company_id
+                    AND t.commercial_partner_id = r.commercial_partner_id
+            """,
+            lines=lines,
+            dso_from=dso_from,
+            order_where=order_where,
+        )
+
+    @api.model
+    def _risk_receivable_aggregate(self, companies, commercial_partner_ids, today):
+        """
+        Receivable KPIs of many commercial partners in a single pass over posted
+        receivable journal items (company currency residuals, per due date, so
+        installments age separately). Receivable items carry the commercial
+        partner, which the query filters and groups on:
+          - outstanding = open debit residuals (invoices, installments, ...)
+          - overdue     = open debit residuals past their due date
+          - credit_open = open credit residuals (credit notes, unreconciled payments)
+          - aging_current / aging_0_30 / aging_31_60 / aging_61_90 / aging_90_plus
+            (open invoice residuals by days past due)
+          - avg_days_overdue = overdue residuals weighted by days past due
+          - dso = net outstanding / credit sales of the last DSO_PERIOD_DAYS * DSO_PERIOD_DAYS
+          - draft_invoiced = receivable balance of draft invoices / credit notes
+          - to_invoice = ordered quantities of confirmed orders not on any
+            invoice yet (delivered or not), taxes included like the
+            receivables, converted to company currency; quantities on draft
+            invoices are left to draft_invoiced so they never count twice
+        Returns {(company_id, commercial_partner_id): {...}}.
+        """
+        if not companies or not commercial_partner_ids:
+            return {}
+        self.env['account.move.line'].flush_model()
+        self.env['account.move'].flush_model(['move_type'])
+        self.env['sale.order'].flush_model(['state', 'pv_commercial_partner_id', 'company_id', 'currency_id'])
+        self.env['sale.order.line'].flush_model(['display_type', 'product_uom_qty', 'qty_invoiced', 'price_total'])
+        dso_from = today - timedelta(days=DSO_PERIOD_DAYS)
+        self.env.cr.execute(self._risk_receivable_query(
+            today,
+            dso_from,
+            SQL(
+                "l.partner_id IN %s AND l.company_id IN %s",
+                tuple(commercial_partner_ids),
+                tuple(companies.ids),
+            ),
+            SQL(
+                "so.pv_commercial_partner_id IN %s AND so.company_id IN %s",
+                tuple(commercial_partner_ids),
+                tuple(companies.ids),
+            ),
+        ))
+
+        result = {}
+        rows = self.env.cr.dictfetchall()
+        to_invoice = self._risk_convert_to_invoice(rows, today)
+        for row in rows:
+            vals = {k: row[k] or 0.0 for k in RECEIVABLE_AGGREGATE_KEYS}
+            vals['to_invoice'] = to_invoice.get((row['company_id'], row['commercial_partner_id']), 0.0)
+            net = max(0.0, vals['outstanding'] - vals['credit_open'])
+            sales = row['sales_dso_period'] or 0.0
+            vals['dso'] = net / sales * DSO_PERIOD_DAYS if sales > 0 else 0.0
+            vals['avg_days_overdue'] = (
+                (row['overdue_days_weighted'] or 0.0) / vals['overdue'] if vals['overdue'] > 0 else 0.0
+            )
+            result[row['company_id'], row['commercial_partner_id']] = vals
+        return result
+
+    @api.model
+    def _risk_conversion_rates(self, company, currencies, date):
+        """
+        Rates converting `currencies` to the currency of `company` on `date`:
+        {currency_id: rate}, as res.currency._get_conversion_rate. Rates come
+        from the per-worker rate cache keyed by (currency, date); the missing
+        ones are read in a single query (res.currency._get_rates). Refreshes
+        clear the cache when they start, so a refresh reads each rate once.
+        """
+        dbname = self.env.cr.dbname
+        needed = currencies | company.currency_id
+        rates = {}
+        for currency in needed:
+            rate = risk_cache.rate_cache.get((dbname, company.id, currency.id, date), risk_cache.DEFAULT_RATE_TTL)
+            if rate is not None:
+                rates[currency.id] = rate
+        missing = needed.filtered(lambda currency: currency.id not in rates)
+        if missing:
+            for currency_id, rate in missing._get_rates(company, date).items():
+                rates[currency_id] = rate
+                risk_cache.rate_cache.put((dbname, company.id, currency_id, date), rate)
+        company_rate = rates[company.currency_id.id]
+        return {currency.id: company_rate / rates[currency.id] for currency in currencies}
+
+    @api.model
+    def _risk_convert_to_invoice(self, rows, today):
+        """
+        Sum the per-currency amounts to invoice of aggregate rows in company
+        currency: {(company_id, commercial_partner_id): amount}, with the
+        cached rates of the day (see _risk_conversion_rates).
+        """
+        companies = self.env['res.company'].browse({row['company_id'] for row in rows})
+        currencies = self.env['res.currency'].browse({
+            int(currency_id)
+            for row in rows
+            for currency_id in (row['to_invoice_by_currency'] or {})
+        })
+        rates = {}
+        if currencies:
+            for company in companies:
+                for currency_id, rate in self._risk_conversion_rates(company, currencies, today).items():
+                    rates[currency_id, company.id] = rate
+        result = {}
+        for row in rows:
+            company = companies.browse(row['company_id'])
+            total = 0.0
+            for currency_id, amount in (row['to_invoice_by_currency'] or {}).items():
+                total += company.currency_id.round(amount * rates[int(currency_id), company.id])
+            result[row['company_id'], row['commercial_partner_id']] = total
+        return result
+
+    @api.model
+    def _risk_pending_exposure(self, config, aggregates):
+        """Exposure not posted yet (to invoice, drafts when enabled), one item per aggregate dict."""
+        return [
+            agg.get('to_invoice', 0.0) + (agg.get('draft_invoiced', 0.0) if config.include_draft_invoices else 0.0)
+            for agg in aggregates
+        ]
+
+    @api.model
+    def _risk_score_batch(self, config, outstanding, overdue, credit_open, orders_in_window, credit_limit, pending=None):
+        """
+        Score a batch of customers with the company's weights and thresholds
+        (see tools/risk_scoring.py). Takes parallel lists of raw aggregates and
+        returns parallel lists (credit_util_pct, overdue_ratio, score, level).
+        `pending` is the exposure not posted yet (see _risk_pending_exposure).
+        """
+        credit_util_pct, overdue_ratio = risk_scoring.exposure_ratios(
+            outstanding, overdue, credit_open, credit_limit, pending=pending,
+        )
+        scores, levels = risk_scoring.score_levels(
+            credit_util_pct, overdue_ratio, orders_in_window, config,
+        )
+        return credit_util_pct, overdue_ratio, scores, levels
 
     # ------------------------------
     # Compute everything in one pass
@@ -98,110 +484,229 @@ class ResPartner(models.Model):
         'invoice_ids.invoice_date_due',
         'invoice_ids.state',
         'invoice_ids.move_type',
+        'invoice_ids.amount_total_signed',
         'sale_order_ids.state',
         'sale_order_ids.date_order',
+        # no order line dependencies: quotation edits must not rescore the
+        # customer, see _risk_snapshot_to_recompute for the to-invoice exposure
+        # documents booked on a contact roll up to its commercial partner
+        'child_ids.invoice_ids.amount_residual',
+        'child_ids.invoice_ids.invoice_date_due',
+        'child_ids.invoice_ids.state',
+        'child_ids.sale_order_ids.state',
+        'child_ids.sale_order_ids.date_order',
+        # contacts follow their commercial entity
+        'commercial_partner_id',
+        *('commercial_partner_id.%s' % fname for fname in RISK_SNAPSHOT_FIELDS),
     )
     def _compute_risk_snapshot(self):
-        Move = self.env['account.move'].sudo()
-        Sale = self.env['sale.order'].sudo()
+        contacts = self.filtered(lambda p: p.commercial_partner_id and p.commercial_partner_id != p)
+        entities = self - contacts
+        if entities:
+            entities._compute_risk_snapshot_entities()
+        for partner in contacts:
+            entity = partner.commercial_partner_id
+            for fname in RISK_SNAPSHOT_FIELDS:
+                partner[fname] = entity[fname]
+
+    def _risk_home_companies(self):
+        """
+        Company scoring the stored snapshot of each shared customer (no
+        company) in `self`, whoever triggers the recompute: the first company
+        (lowest id) in which it has activity, as paired by
+        pv.debtor.kpi._shared_customer_companies, else the first company.
+        Returns {partner_id: company}.
+        """
+        first_company = self.env['res.company'].sudo().search([], order='id', limit=1)
+        active = self.env['pv.debtor.kpi']._shared_customer_companies(set(self._origin.ids)) if self._origin else {}
+        return {
+            partner._origin.id: min(active.get(partner._origin.id) or [first_company], key=lambda c: c.id)
+            for partner in self
+        }
+
+    def _compute_risk_snapshot_entities(self):
+        with self.env['pv.risk.perf.log']._measure('partner_snapshot', len(self)):
+            now_dt = fields.Datetime.now()
+            today = fields.Date.context_today(self)
+
+            # Group the batch by (company, commercial partner); shared
+            # customers are scored in a fixed company, not the current one
+            shared = self.filtered(lambda p: not p.company_id)
+            home = shared._risk_home_companies() if shared else {}
+            by_company = defaultdict(lambda: self.browse())
+            for partner in self:
+                by_company[partner.company_id or home[partner._origin.id]] |= partner
+
+            # Config, once per company
+            config = {company: self._get_risk_config(company) for company in by_company}
+
+            # One set of aggregates per distinct window (usually a single one)
+            aggregates = {}
+            by_window = defaultdict(lambda: self.env['res.company'])
+            for company, risk_config in config.items():
+                by_window[risk_config.window_days] |= company
+            for window_days, companies in by_window.items():
+                cp_ids = {
+                    cp._origin.id
+                    for company in companies
+                    for cp in by_company[company].commercial_partner_id
+                    if cp._origin.id
+                }
+                aggregates.update(self._risk_aggregate_batch(
+                    companies, cp_ids, today, now_dt - timedelta(days=window_days),
+                ))
+
+            # Score each company's partners in one vectorized pass
+            for company, partners in by_company.items():
+                risk_config = config[company]
+                aggs = [
+                    aggregates.get((company.id, partner.commercial_partner_id._origin.id), {})
+                    for partner in partners
+                ]
+                orders_in_window = [agg.get('orders_in_window', 0) for agg in aggs]
+                credit_util_pct, overdue_ratio, scores, levels = self._risk_score_batch(
+                    risk_config,
+                    [agg.get('outstanding', 0.0) for agg in aggs],
+                    [agg.get('overdue', 0.0) for agg in aggs],
+                    [agg.get('credit_open', 0.0) for agg in aggs],
+                    orders_in_window,
+                    [partner._get_partner_credit_limit(company) for partner in partners],
+                    self._risk_pending_exposure(risk_config, aggs),
+                )
+
+                # Assign (stored) values
+                for i, partner in enumerate(partners):
+                    partner.risk_activity_window_days = risk_config.window_days
+                    partner.risk_credit_util_pct = credit_util_pct[i]
+                    partner.risk_overdue_ratio = overdue_ratio[i]
+                    partner.risk_orders_90d = orders_in_window[i]
+                    partner.risk_score = scores[i]
+                    partner.risk_level = levels[i]
+                    partner.risk_last_recomputed = now_dt
+
 
-        for partner in self:
-            company = partner.company_id or self.env.company
-            cp = partner.commercial_partner_id
-            today = fields.Date.context_today(partner)
-
-            # Config
-            window_days = partner._get_activity_window_days_for_company(company)
-            threshold_low, threshold_high = partner._get_thresholds_for_company(company)
-            date_from_dt = fields.Datetime.now() - timedelta(days=window_days)
-
-            # -------- Open Invoices (denominator) --------
-            inv_domain = [
-                ('company_id', '=', company.id),
-                ('partner_id.commercial_partner_id', '=', cp.id),
-                ('move_type', '=', 'out_invoice'),
-                ('state', '=', 'posted'),
-                ('amount_residual', '>', 0),
-            ]
-            inv_moves = Move.with_company(company).search(inv_domain)
-            total_open_invoices = sum(m.amount_residual for m in inv_moves) or 0.0
-
-            # Overdue part of invoices (numerator base)
-            overdue_invoices_amount = sum(
-                m.amount_residual
-                for m in inv_moves
-                if m.invoice_date_due and m.invoice_date_due < today
-            ) or 0.0
-
-            # -------- Open Credit Notes (to subtract from numerator) --------
-            # We take open (not fully reconciled) customer credit notes and sum their residuals
-            cn_domain = [
-                ('company_id', '=', company.id),
-                ('partner_id.commercial_partner_id', '=', cp.id),
-                ('move_type', '=', 'out_refund'),
-                ('state', '=', 'posted'),
-                ('amount_residual', '!=', 0),
-            ]
-            cn_moves = Move.with_company(company).search(cn_domain)
-            # Use absolute to be robust to sign conventions
-            open_credit_notes_total = sum(abs(m.amount_residual) for m in cn_moves) or 0.0
-
-            # -------- Orders in window --------
-            orders_in_window = Sale.with_company(company).search_count([
-                ('company_id', '=', company.id),
-                ('partner_id.commercial_partner_id', '=', cp.id),
-                ('state', 'in', ('sale', 'done')),
-                ('date_order', '>=', date_from_dt),
+    def _recompute_risk_snapshot(self):
+        """Force a recompute of the stored snapshot and write it to the database."""
+        partners = self.sudo()
+        for fname in RISK_SNAPSHOT_FIELDS:
+            self.env.add_to_compute(partners._fields[fname], partners)
+        partners.flush_recordset(list(RISK_SNAPSHOT_FIELDS))
+
+    @api.model
+    def _risk_levels_for_gate(self, commercial_partners, max_age_minutes):
+        """
+        Risk level per commercial partner for the confirmation gate.
+        Stored snapshots are read in one query; only partners whose snapshot is
+        missing or older than `max_age_minutes` (0 = never stale) are
+        recomputed live. Returns {partner_id: level}.
+        """
+        cps = commercial_partners.sudo()
+        if not cps:
+            return {}
+        cps.flush_recordset(['risk_level', 'risk_last_recomputed'])
+        self.env.cr.execute(SQL(
+            "SELECT id, risk_level, risk_last_recomputed FROM res_partner WHERE id IN %s",
+            tuple(cps.ids),
+        ))
+        rows = self.env.cr.fetchall()
+        levels = {pid: level for pid, level, _recomputed in rows}
+
+        if max_age_minutes:
+            oldest = fields.Datetime.now() - timedelta(minutes=max_age_minutes)
+            stale = cps.browse([
+                pid for pid, level, recomputed in rows
+                if not level or not recomputed or recomputed < oldest
             ])
+        else:
+            stale = cps.browse([pid for pid, level, _recomputed in rows if not level])
+        if stale:
+            stale._recompute_risk_snapshot()
+            levels.update({partner.id: partner.risk_level for partner in stale})
+        return levels
+
+    @api.model
+    def _risk_cache_params(self):
+        """(ttl seconds, max entries) of the per-worker snapshot cache."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        try:
+            ttl = float(ICP.get_param('pv_sale_customer_risk.snapshot_cache_ttl', risk_cache.DEFAULT_TTL))
+            size = int(ICP.get_param('pv_sale_customer_risk.snapshot_cache_size', risk_cache.DEFAULT_SIZE))
+        except (TypeError, ValueError):
+            return risk_cache.DEFAULT_TTL, risk_cache.DEFAULT_SIZE
+        return ttl, size
+
+    def _risk_snapshot_cached(self, company):
+        """
+        Risk snapshot (RISK_SNAPSHOT_FIELDS) of this commercial partner in
+        `company`, served from the per-worker cache (tools/risk_cache.py) when
+        fresh; a TTL of 0 disables the cache.
+        """
+        self.ensure_one()
+        partner = self.sudo().with_company(company)
+        ttl, size = self._risk_cache_params()
+        key = (self.env.cr.dbname, company.id, self.id)
+        snapshot = risk_cache.snapshot_cache.get(key, ttl) if ttl > 0 else None
+        if snapshot is None:
+            snapshot = {fname: partner[fname] for fname in RISK_SNAPSHOT_FIELDS}
+            if ttl > 0:
+                risk_cache.snapshot_cache.put(key, snapshot, size)
+        return snapshot
 
-            # -------- Credit utilization & overdue ratio --------
-            # Net exposure for utilization (open invoices minus open credit notes, not below zero)
-            net_outstanding = max(0.0, total_open_invoices - open_credit_notes_total)
-
-            credit_limit = partner._get_partner_credit_limit(company)
-            credit_util_pct = (net_outstanding / credit_limit) * 100.0 if credit_limit else 0.0
-
-            # Overdue Ratio
-            # (overdue invoices - open credit notes) / total open invoices
-            numerator = max(0.0, overdue_invoices_amount - open_credit_notes_total)
-            overdue_ratio = (numerator / total_open_invoices) if total_open_invoices > 0 else 0.0
-
-            # -------- Score --------
-            score = 0
-            # Credit utilization weight
-            if credit_util_pct > 100:
-                score += 60
-            elif credit_util_pct > 80:
-                score += 40
-            elif credit_util_pct > 50:
-                score += 20
-            # Overdue weight
-            if overdue_ratio > 0.20:
-                score += 50
-            elif overdue_ratio > 0.05:
-                score += 20
-            # Activity weight
-            if orders_in_window >= 10:
-                score += 20
-            elif orders_in_window >= 5:
-                score += 10
-
-            level = 'low'
-            if score >= threshold_high:
-                level = 'high'
-            elif score >= threshold_low:
-                level = 'medium'
-
-            # Assign (non-stored) values
-            partner.risk_activity_window_days = window_days
-            partner.risk_credit_util_pct = credit_util_pct
-            partner.risk_overdue_ratio = overdue_ratio
-            partner.risk_orders_90d = orders_in_window
-            partner.risk_score = score
-            partner.risk_level = level
-            partner.risk_last_recomputed = fields.Datetime.now()
+    @api.model
+    def _risk_cache_invalidate(self, pairs):
+        """Drop cached snapshots of (company_id, commercial_partner_id) pairs, now and after commit."""
+        keys = [(self.env.cr.dbname, company_id, cp_id) for company_id, cp_id in pairs]
+        if keys:
+            risk_cache.snapshot_cache.invalidate(keys)
+            # Another request may cache the pre-commit values meanwhile
+            self.env.cr.postcommit.add(lambda: risk_cache.snapshot_cache.invalidate(keys))
+
+    @api.model
+    def _risk_snapshot_to_recompute(self, commercial_partner_ids):
+        """
+        Recompute the snapshots of the given commercial entities and their
+        contacts at the next flush. Called by the dirty queue hooks (order
+        confirmation and cancellation, invoice posting, credit limit changes),
+        which is where the to-invoice exposure moves.
+        """
+        partners = self.sudo().with_context(active_test=False).search(
+            [('commercial_partner_id', 'in', list(commercial_partner_ids))]
+        )
+        for fname in RISK_SNAPSHOT_FIELDS:
+            self.env.add_to_compute(self._fields[fname], partners)
+
+    def write(self, vals):
+        if not RISK_KPI_PARTNER_FIELDS.intersection(vals):
+            return super().write(vals)
+        entities = self.commercial_partner_id
+        res = super().write(vals)
+        # Both the former and the new commercial entity of moved contacts
+        self.env['pv.risk.dirty.partner']._enqueue_partners(entities | self.commercial_partner_id)
+        return res
 
     # Button: Recompute now
     def action_recompute_risk(self):
-        self.sudo()._compute_risk_snapshot()
+        self._recompute_risk_snapshot()
+        return True
+
+    @api.model
+    def _schedule_risk_recompute(self):
+        """Restart the snapshot cron from the first customer and run it soon."""
+        cursor = self.env['pv.risk.cron.cursor']._get('partner_risk')
+        cursor.write({'last_id': 0})
+        self.env.ref('pv_sale_customer_risk_score.ir_cron_pv_recompute_risk').sudo()._trigger()
+
+    @api.model
+    def _cron_recompute_partner_risk(self):
+        """Cron entry point – refresh snapshots that age with time (overdue, window)."""
+        risk_cache.rate_cache.clear()
+        cursor = self.env['pv.risk.cron.cursor']._get('partner_risk')
+        # Snapshots live on commercial entities (contacts copy them), which
+        # may have no customer rank of their own
+        self._pv_run_chunked(
+            cursor,
+            'res.partner',
+            self.env['pv.debtor.kpi']._customer_entity_domain(),
+            lambda partners: partners._recompute_risk_snapshot(),
+        )
         return True
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+from odoo import api, fields, models
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_CRON_BATCH_SIZE = 500
+# Share of the worker's real-time limit a run may use before yielding
+CRON_TIME_BUDGET_RATIO = 0.8
+
+
+class PvRiskCronCursor(models.Model):
+    _name = "pv.risk.cron.cursor"
+    _description = "Risk Cron Progress Cursor"
+
+    job = fields.Char(required=True, index=True)
+    last_id = fields.Integer(string="Last Processed ID", default=0)
+    run_started = fields.Datetime(string="Run Started")
+    full_run = fields.Boolean(string="Full Run")
+
+    _sql_constraints = [
+        ("uniq_job", "unique(job)", "One cursor per cron job."),
+    ]
+
+    @api.model
+    def _get(self, job):
+        cursor = self.sudo().search([("job", "=", job)], limit=1)
+        return cursor or self.sudo().create({"job": job})
+
+
+class PvRiskCronMixin(models.AbstractModel):
+    _name = "pv.risk.cron.mixin"
+    _description = "Chunked, resumable cron runner for risk recomputation"
+
+    @api.model
+    def _pv_cron_batch_size(self):
+        ICP = self.env["ir.config_parameter"].sudo()
+        try:
+            return max(1, int(ICP.get_param("pv_sale_customer_risk.cron_batch_size", DEFAULT_CRON_BATCH_SIZE)))
+        except (TypeError, ValueError):
+            return DEFAULT_CRON_BATCH_SIZE
+
+    @api.model
+    def _pv_cron_time_budget(self):
+        """Seconds a run may spend before yielding, or None when unlimited."""
+        limit = config.get("limit_time_real_cron") or -1
+        if limit <= 0:
+            limit = config.get("limit_time_real") or 0
+        return limit * CRON_TIME_BUDGET_RATIO if limit > 0 else None
+
+    @api.model
+    def _pv_run_chunked(self, cursor, model, domain, process):
+        """
+        Process the records of `model` matching `domain` in id order, `process`
+        being called with one chunk at a time. Progress is saved on `cursor`
+        (a pv.risk.cron.cursor) and committed after each chunk when running
+        from a cron, so an interrupted run resumes after the last chunk.
+        When the time budget runs out the cron is re-triggered through the
+        cron progress API. Returns True once every record was processed.
+        """
+        Model = self.env[model]
+        Cron = self.env["ir.cron"]
+        in_cron = bool(self.env.context.get("cron_id"))
+        chunk_size = self._pv_cron_batch_size()
+        budget = self._pv_cron_time_budget()
+        started = time.monotonic()
+
+        remaining = Model.search_count(domain + [("id", ">", cursor.last_id)])
+        done = 0
+        while remaining:
+            batch = Model.search(domain + [("id", ">", cursor.last_id)], order="id", limit=chunk_size)
+            if not batch:
+                break
+            process(batch)
+            cursor.last_id = batch[-1].id
+            done += len(batch)
+            remaining = max(0, remaining - len(batch))
+            if in_cron:
+                if hasattr(Cron, "_commit_progress"):
+                    Cron._commit_progress(len(batch), remaining=remaining)
+                else:
+                    Cron._notify_progress(done=done, remaining=remaining)
+                    self.env.cr.commit()
+            if remaining and budget and time.monotonic() - started > budget:
+                _logger.info(
+                    "%s: time budget reached after %s records, %s remaining; rescheduling",
+                    cursor.job, done, remaining,
+                )
+                return False
+
+        cursor.last_id = 0
+        if in_cron and not hasattr(Cron, "_commit_progress"):
+            Cron._notify_progress(done=done, remaining=0)
+        return True
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+from psycopg2 import errors
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+from ..tools import risk_cache
+
+_logger = logging.getLogger(__name__)
+
+DIRTY_QUEUE_CRON_JOB = "dirty_queue"
+
+
+class PvRiskDirtyPartner(models.Model):
+    _name = "pv.risk.dirty.partner"
+    _inherit = ["pv.risk.cron.mixin"]
+    _description = "Risk Invalidation Queue"
+    _order = "id"
+    _log_access = False
+
+    company_id = fields.Many2one("res.company", required=True, ondelete="cascade")
+    commercial_partner_id = fields.Many2one(
+        "res.partner", string="Customer", required=True, ondelete="cascade"
+    )
+    enqueued_at = fields.Datetime(required=True, default=fields.Datetime.now)
+
+    _sql_constraints = [
+        (
+            "uniq_company_partner",
+            "unique(company_id, commercial_partner_id)",
+            "A customer is queued at most once per company.",
+        )
+    ]
+
+    @api.model
+    def _enqueue(self, pairs):
+        """
+        Mark (company_id, commercial_partner_id) pairs dirty, drop their
+        cached risk snapshots and recompute the stored ones. Already queued pairs keep their original
+        timestamp, so drain latency is measured from the first change; the
+        no-op update still locks the entry, which a concurrent drain needs
+        (see _drain).
+        """
+        pairs = {(company_id, cp_id) for company_id, cp_id in pairs if company_id and cp_id}
+        if not pairs:
+            return
+        self.env["res.partner"]._risk_cache_invalidate(pairs)
+        self.env["res.partner"]._risk_snapshot_to_recompute({cp_id for _company_id, cp_id in pairs})
+        now_dt = fields.Datetime.now()
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO %s (company_id, commercial_partner_id, enqueued_at) VALUES %s
+            ON CONFLICT (company_id, commercial_partner_id) DO UPDATE SET enqueued_at = %s
+            """,
+            SQL.identifier(self._table),
+            SQL(", ").join(SQL("%s", (company_id, cp_id, now_dt)) for company_id, cp_id in sorted(pairs)),
+            SQL.identifier(self._table, "enqueued_at"),
+        ))
+
+    @api.model
+    def _enqueue_moves(self, moves):
+        # Vendor bills and miscellaneous entries do not change customer risk
+        self._enqueue(
+            (move.company_id.id, move.commercial_partner_id.id)
+            for move in moves
+            if move.move_type in ("out_invoice", "out_refund")
+        )
+
+    @api.model
+    def _enqueue_move_lines(self, lines):
+        self._enqueue(
+            (line.company_id.id, line.partner_id.commercial_partner_id.id)
+            for line in lines
+            if line.account_id.account_type == "asset_receivable"
+        )
+
+    @api.model
+    def _enqueue_orders(self, orders):
+        self._enqueue(
+            (order.company_id.id, order.pv_commercial_partner_id.id)
+            for order in orders
+        )
+
+    @api.model
+    def _enqueue_partners(self, commercial_partners):
+        """Queue every KPI row of `commercial_partners`, and their own (or the current) company."""
+        rows = self.env["pv.debtor.kpi"].sudo()._read_group(
+            [("commercial_partner_id", "in", commercial_partners.ids)],
+            ["company_id", "commercial_partner_id"],
+        )
+        self._enqueue(
+            [(company.id, cp.id) for company, cp in rows]
+            + [((cp.company_id or self.env.company).id, cp.id) for cp in commercial_partners]
+        )
+
+    @api.model
+    def get_queue_metrics(self):
+        """Queue depth and age of the oldest entry (seconds)."""
+        self.flush_model()
+        self.env.cr.execute(SQL(
+            "SELECT COUNT(*), MIN(enqueued_at) FROM %s",
+            SQL.identifier(self._table),
+        ))
+        depth, oldest = self.env.cr.fetchone()
+        age = (fields.Datetime.now() - oldest).total_seconds() if oldest else 0.0
+        return {"depth": depth, "oldest_age_seconds": age}
+
+    def _drain(self):
+        """
+        Dequeue the pairs in `self`, then refresh their KPI rows. Pairs of
+        non-customers (no contact with a customer rank) are dropped. The
+        materialized view backend is only refreshed as a whole (KPI cron).
+
+        Entries are claimed (deleted) before computing, so a change enqueued
+        meanwhile creates a fresh entry instead of being deleted with the
+        claimed one. An entry re-enqueued by a transaction committed after
+        this one started fails to serialize: the claim is rolled back and
+        the entries wait for the next run.
+        """
+        Kpi = self.env["pv.debtor.kpi"]
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute(SQL(
+                    "DELETE FROM %s WHERE id IN %s RETURNING company_id, commercial_partner_id",
+                    SQL.identifier(self._table),
+                    tuple(self.ids),
+                ))
+                claimed = self.env.cr.fetchall()
+        except errors.SerializationFailure:
+            _logger.info("pv.risk.dirty.partner: %s entries changed while draining, retried next run", len(self))
+            return
+        self.invalidate_model()
+        if not claimed or Kpi._kpi_backend() == "matview":
+            return
+        now_dt = fields.Datetime.now()
+        customers = set(self.env["res.partner"].search(
+            Kpi._customer_entity_domain({cp_id for _company_id, cp_id in claimed})
+        ).ids)
+        by_company = {}
+        for company_id, cp_id in claimed:
+            if cp_id in customers:
+                by_company.setdefault(company_id, set()).add(cp_id)
+        for company_id, cp_ids in by_company.items():
+            Kpi._refresh_chunk(company_id, cp_ids, now_dt)
+
+    @api.model
+    def cron_drain_queue(self):
+        """
+        Consumer cron: drain the queue in chunks (see pv.risk.cron.mixin) and
+        log queue depth, drain latency and throughput.
+        """
+        before = self.get_queue_metrics()
+        if not before["depth"]:
+            return True
+        risk_cache.rate_cache.clear()
+        cursor = self.env["pv.risk.cron.cursor"]._get(DIRTY_QUEUE_CRON_JOB)
+        stats = {"partners": 0, "max_latency": 0.0}
+
+        def process(entries):
+            now_dt = fields.Datetime.now()
+            stats["partners"] += len(entries)
+            stats["max_latency"] = max(
+                [stats["max_latency"]]
+                + [(now_dt - entry.enqueued_at).total_seconds() for entry in entries]
+            )
+            entries._drain()
+
+        started = time.monotonic()
+        self._pv_run_chunked(cursor, self._name, [], process)
+        elapsed = time.monotonic() - started
+        _logger.info(
+            "pv.risk.dirty.partner drained: %s partners in %.2fs (%.1f partners/s), "
+            "max drain latency %.0fs, depth %s -> %s",
+            stats["partners"],
+            elapsed,
+            stats["partners"] / elapsed if elapsed else 0.0,
+            stats["max_latency"],
+            before["depth"],
+            self.get_queue_metrics()["depth"],
+        )
+        return True
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import base64
+import cProfile
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from odoo import SUPERUSER_ID, api, fields, models
+from odoo.tools import str2bool
+
+from ..tools import risk_cache
+
+_logger = logging.getLogger(__name__)
+
+PERF_LOG_PARAM = "pv_sale_customer_risk.perf_log"
+# Context flag: profile the measured call and attach the cProfile stats to its log
+PERF_PROFILE_CONTEXT_KEY = "pv_risk_profile"
+PERF_LOG_RETENTION_DAYS = 30
+
+# Measurements nest (confirm_gate -> partner_snapshot) but only one cProfile
+# profiler may be active per thread: the outermost measurement profiles
+_profiling = threading.local()
+
+
+class PvRiskPerfLog(models.Model):
+    _name = "pv.risk.perf.log"
+    _description = "Risk Computation Performance Log"
+    _order = "id desc"
+
+    operation = fields.Selection(
+        [
+            ("partner_snapshot", "Partner Risk Snapshot"),
+            ("debtor_kpi_refresh", "Debtor KPI Refresh"),
+            ("confirm_gate", "Confirmation Risk Gate"),
+        ],
+        required=True,
+        index=True,
+    )
+    company_id = fields.Many2one("res.company", ondelete="cascade")
+    partners = fields.Integer(string="Partners Processed", aggregator="sum")
+    wall_time = fields.Float(string="Wall Time (s)", digits=(16, 4), aggregator="avg")
+    query_count = fields.Integer(string="Queries", aggregator="avg")
+    query_time = fields.Float(string="Query Time (s)", digits=(16, 4), aggregator="avg")
+    queries_per_partner = fields.Float(string="Queries / Partner", digits=(16, 2), aggregator="avg")
+    cache_hits = fields.Integer(string="Cache Hits", aggregator="sum")
+    cache_misses = fields.Integer(string="Cache Misses", aggregator="sum")
+    profile_attachment_id = fields.Many2one("ir.attachment", string="Profile", ondelete="set null")
+
+    @api.model
+    def _enabled(self):
+        value = self.env["ir.config_parameter"].sudo().get_param(PERF_LOG_PARAM)
+        return bool(str2bool(value or "0", default=False))
+
+    @contextmanager
+    def _measure(self, operation, partners=0):
+        """
+        Measure the enclosed block: wall time, queries issued by the current
+        thread (count and time), partners processed and snapshot cache hits
+        and misses. Always logs a structured line (INFO when the perf log is
+        enabled, DEBUG otherwise); with pv_sale_customer_risk.perf_log set,
+        also records a pv.risk.perf.log row. With the pv_risk_profile context
+        flag the block runs under cProfile and the stats are attached to the
+        row; nested measurements are then only timed, the outermost one holds
+        the profile. Rows are written on their own cursor, so a rolled back
+        operation (e.g. a blocked confirmation) is still recorded.
+        """
+        enabled = self._enabled()
+        profile = bool(self.env.context.get(PERF_PROFILE_CONTEXT_KEY))
+        if not enabled and not profile and not _logger.isEnabledFor(logging.DEBUG):
+            yield
+            return
+
+        thread = threading.current_thread()
+        # Only set on request threads; counted by odoo.sql_db once present
+        if not hasattr(thread, "query_count"):
+            thread.query_count = 0
+            thread.query_time = 0.0
+        queries_before, query_time_before = thread.query_count, thread.query_time
+        cache_before = risk_cache.snapshot_cache.stats()
+        profiler = None
+        if profile and not getattr(_profiling, "active", False):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiling tool is already running in this thread
+                _logger.warning("pv_risk_perf: cannot profile %s, a profiler is already active", operation)
+                profiler = None
+            else:
+                _profiling.active = True
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+                _profiling.active = False
+            cache_after = risk_cache.snapshot_cache.stats()
+            query_count = thread.query_count - queries_before
+            vals = {
+                "operation": operation,
+                "company_id": self.env.company.id,
+                "partners": partners,
+                "wall_time": time.perf_counter() - started,
+                "query_count": query_count,
+                "query_time": thread.query_time - query_time_before,
+                "queries_per_partner": query_count / partners if partners else 0.0,
+                "cache_hits": cache_after["hits"] - cache_before["hits"],
+                "cache_misses": cache_after["misses"] - cache_before["misses"],
+            }
+            _logger.log(
+                logging.INFO if enabled else logging.DEBUG,
+                "pv_risk_perf %s", json.dumps(vals, sort_keys=True),
+            )
+            if enabled or profiler:
+                self._record(vals, profiler)
+
+    @api.model
+    def _record(self, vals, profiler=None):
+        with self.env.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            log = env[self._name].create(vals)
+            if profiler:
+                stream = io.StringIO()
+                pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(80)
+                attachment = env["ir.attachment"].create({
+                    "name": "pv_risk_%s_%s.prof.txt" % (vals["operation"], log.id),
+                    "res_model": self._name,
+                    "res_id": log.id,
+                    "mimetype": "text/plain",
+                    "datas": base64.b64encode(stream.getvalue().encode()),
+                })
+                log.profile_attachment_id = attachment
+
+    @api.autovacuum
+    def _gc_perf_logs(self):
+        cutoff = fields.Datetime.now() - timedelta(days=PERF_LOG_RETENTION_DAYS)
+        self.sudo().search([("create_date", "<", cutoff)]).unlink()
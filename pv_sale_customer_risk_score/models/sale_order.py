@@ -1,12 +1,30 @@
 # pv_sale_customer_risk_score/models/sale_order.py
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError
-from odoo.tools import str2bool
+from odoo.tools import SQL
+from odoo.tools.sql import column_exists, create_column, create_index
+
+# Related risk fields served from the customer's stored (indexed) snapshot columns
+_PV_RISK_PARTNER_COLUMNS = {
+    'partner_risk_score': 'risk_score',
+    'partner_risk_level': 'risk_level',
+    'partner_risk_credit_util_pct': 'risk_credit_util_pct',
+    'partner_risk_overdue_ratio': 'risk_overdue_ratio',
+    'partner_risk_orders_90d': 'risk_orders_90d',
+}
 
 
 class SaleOrder(models.Model):
     _inherit = 'sale.order'
 
+    # Denormalized like account.move.commercial_partner_id: the risk
+    # aggregates filter and group orders on it without joining res_partner
+    pv_commercial_partner_id = fields.Many2one(
+        'res.partner',
+        string="Commercial Entity",
+        related='partner_id.commercial_partner_id',
+        store=True,
+    )
     partner_risk_score = fields.Integer(
         string="Customer Risk Score",
         related="partner_id.commercial_partner_id.risk_score",
@@ -34,24 +52,83 @@ class SaleOrder(models.Model):
         readonly=True,
     )
 
-    def _pv_get_param_bool(self, key, default=False):
-        company = self.company_id or self.env.company
-        icp = self.env['ir.config_parameter'].sudo().with_company(company)
-        val = icp.get_param(key, '1' if default else '0') or ('1' if default else '0')
-        try:
-            return bool(str2bool(val))
-        except Exception:
-            return bool(default)
+    def _auto_init(self):
+        # Fill the new column in one statement instead of recomputing every order
+        if not column_exists(self.env.cr, 'sale_order', 'pv_commercial_partner_id'):
+            create_column(self.env.cr, 'sale_order', 'pv_commercial_partner_id', 'int4')
+            self.env.cr.execute(SQL("""
+                UPDATE sale_order so
+                   SET pv_commercial_partner_id = p.commercial_partner_id
+                  FROM res_partner p
+                 WHERE p.id = so.partner_id
+            """))
+        return super()._auto_init()
+
+    def init(self):
+        super().init()
+        # Orders per customer (res.partner._risk_orders_in_window_batch, amounts to invoice)
+        create_index(
+            self.env.cr,
+            'pv_sale_order_commercial_partner_idx',
+            self._table,
+            ['pv_commercial_partner_id', 'company_id', 'date_order'],
+            where="state IN ('sale', 'done')",
+        )
+
+    # ------------------------------
+    # Search / sort on the customer's risk
+    # ------------------------------
+    # Domains on the related fields already resolve to one SQL filter through
+    # partner_id.commercial_partner_id; sorting joins the commercial partner.
+    def _pv_risk_partner_column(self, alias, field_name, query):
+        partner_alias = query.make_alias(alias, 'partner_id')
+        query.add_join('LEFT JOIN', partner_alias, 'res_partner', SQL(
+            "%s = %s",
+            SQL.identifier(alias, 'partner_id'),
+            SQL.identifier(partner_alias, 'id'),
+        ))
+        commercial_alias = query.make_alias(partner_alias, 'commercial_partner_id')
+        query.add_join('LEFT JOIN', commercial_alias, 'res_partner', SQL(
+            "%s = %s",
+            SQL.identifier(partner_alias, 'commercial_partner_id'),
+            SQL.identifier(commercial_alias, 'id'),
+        ))
+        return SQL.identifier(commercial_alias, _PV_RISK_PARTNER_COLUMNS[field_name])
+
+    def _order_field_to_sql(self, alias, field_name, direction, nulls, query):
+        if field_name in _PV_RISK_PARTNER_COLUMNS:
+            self.env['res.partner'].flush_model([_PV_RISK_PARTNER_COLUMNS[field_name], 'commercial_partner_id'])
+            column = self._pv_risk_partner_column(alias, field_name, query)
+            return SQL("%s %s %s", column, direction, nulls)
+        return super()._order_field_to_sql(alias, field_name, direction, nulls, query)
+
+    @api.model
+    def fields_get(self, allfields=None, attributes=None):
+        res = super().fields_get(allfields, attributes)
+        if not attributes or 'sortable' in attributes:
+            for fname in _PV_RISK_PARTNER_COLUMNS:
+                if fname in res:
+                    res[fname]['sortable'] = True
+        return res
+
+    def _pv_risk_config(self):
+        return self.env['res.partner']._get_risk_config(self.company_id or self.env.company)
 
     @api.onchange('partner_id')
     def _pv_onchange_partner_risk_warning(self):
         if not self.partner_id:
             return
-        if not self._pv_get_param_bool('pv_sale_customer_risk.warn_on_quote', True):
+        if not self._pv_risk_config().warn_on_quote:
+            return
+        commercial_partner = self.partner_id.commercial_partner_id._origin
+        if not commercial_partner:
             return
-        level = self.partner_id.commercial_partner_id.risk_level
+        # Served from the per-worker snapshot cache: changing the customer
+        # back and forth on a quotation does not hit the database
+        snapshot = commercial_partner._risk_snapshot_cached(self.company_id or self.env.company)
+        level = snapshot['risk_level']
         if level in ('medium', 'high'):
-            score = self.partner_id.commercial_partner_id.risk_score
+            score = snapshot['risk_score']
             return {
                 'warning': {
                     'title': _("Customer Risk"),
@@ -60,16 +137,86 @@ class SaleOrder(models.Model):
                 }
             }
 
+    def _pv_risk_blocked_orders(self):
+        """
+        Orders whose customer is High risk in a company that blocks them.
+        Customers are deduplicated and their levels read in one batched lookup
+        per company (see res.partner._risk_levels_for_gate).
+        """
+        Partner = self.env['res.partner']
+        blocked = self.browse()
+        for company, orders in self.grouped('company_id').items():
+            config = Partner._get_risk_config(company)
+            if not config.block_on_high:
+                continue
+            levels = Partner._risk_levels_for_gate(
+                orders.partner_id.commercial_partner_id, config.gate_max_age_minutes,
+            )
+            blocked |= orders.filtered(
+                lambda s: levels.get(s.partner_id.commercial_partner_id.id) == 'high'
+            )
+        return blocked
+
+    def _pv_credit_limit_blocked_orders(self):
+        """
+        Orders that would push their customer over the credit limit, in
+        companies that block them. The customer's live exposure (open
+        receivables + amounts to invoice + drafts when enabled - open credits)
+        is read in one batched aggregate per company, then the total (taxes
+        included, like the receivables and Odoo's own credit limit check) of
+        all the customer's orders being confirmed is added.
+        """
+        Partner = self.env['res.partner']
+        today = fields.Date.context_today(self)
+        blocked = self.browse()
+        for company, orders in self.grouped('company_id').items():
+            config = Partner._get_risk_config(company)
+            if not config.block_over_credit_limit:
+                continue
+            customers = orders.partner_id.commercial_partner_id
+            aggregates = Partner._risk_receivable_aggregate(company, set(customers.ids), today)
+            rates = Partner._risk_conversion_rates(company, orders.currency_id, today)
+            for customer, customer_orders in orders.grouped(lambda o: o.partner_id.commercial_partner_id).items():
+                limit = customer._get_partner_credit_limit(company)
+                if limit <= 0:
+                    continue
+                agg = aggregates.get((company.id, customer.id), {})
+                [pending] = Partner._risk_pending_exposure(config, [agg])
+                exposure = agg.get('outstanding', 0.0) + pending - agg.get('credit_open', 0.0)
+                exposure += sum(
+                    company.currency_id.round(order.amount_total * rates[order.currency_id.id])
+                    for order in customer_orders
+                )
+                if exposure > limit:
+                    blocked |= customer_orders
+        return blocked
+
+    def _pv_raise_blocked(self, blocked, message):
+        partners = ", ".join(blocked.mapped('partner_id.commercial_partner_id.display_name')[:3])
+        more = "" if len(blocked) <= 3 else _(" (+%s more)", len(blocked) - 3)
+        raise UserError(message % {'partners': partners, 'more': more})
+
     def action_confirm(self):
-        if self._pv_get_param_bool('pv_sale_customer_risk.block_sale_on_high', False):
-            if not self.env.user.has_group('sales_team.group_sale_manager'):
-                blocked = self.filtered(lambda s: s.partner_id.commercial_partner_id.risk_level == 'high')
-                if blocked:
-                    partners = ", ".join(blocked.mapped('partner_id.commercial_partner_id.display_name')[:3])
-                    more = "" if len(blocked) <= 3 else _(" (+%s more)", len(blocked) - 3)
-                    raise UserError(
-                        _("Confirmation blocked: customer risk is High for %s%s. "
-                          "Ask a Sales Manager to confirm or adjust the risk in Contacts.",
-                          partners, more)
-                    )
-        return super().action_confirm()
+        if not self.env.user.has_group('sales_team.group_sale_manager'):
+            customers = self.partner_id.commercial_partner_id
+            with self.env['pv.risk.perf.log']._measure('confirm_gate', len(customers)):
+                blocked_high = self._pv_risk_blocked_orders()
+                blocked = blocked_high or self._pv_credit_limit_blocked_orders()
+            if blocked_high:
+                self._pv_raise_blocked(blocked_high, _(
+                    "Confirmation blocked: customer risk is High for %(partners)s%(more)s. "
+                    "Ask a Sales Manager to confirm or adjust the risk in Contacts."
+                ))
+            if blocked:
+                self._pv_raise_blocked(blocked, _(
+                    "Confirmation blocked: these orders would exceed the credit limit of "
+                    "%(partners)s%(more)s. Ask a Sales Manager to confirm or raise the limit."
+                ))
+        res = super().action_confirm()
+        self.env['pv.risk.dirty.partner']._enqueue_orders(self)
+        return res
+
+    def _action_cancel(self):
+        res = super()._action_cancel()
+        self.env['pv.risk.dirty.partner']._enqueue_orders(self)
+        return res
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+from . import test_credit_exposure
+from . import test_debtor_kpi_history
+from . import test_debtor_kpi_refresh
+from . import test_debtor_kpi_tools
+from . import test_dirty_queue
+from . import test_partner_risk_snapshot
+from . import test_risk_benchmark
+from . import test_risk_perf_log
+from . import test_risk_query_count
+from . import test_risk_scoring
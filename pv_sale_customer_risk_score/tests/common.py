@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import random
+import time
+from datetime import timedelta
+
+from odoo import fields
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+
+# Query counts per entry point on QUERY_BASELINE['dataset_size'] customers,
+# warm configuration cache and cold record cache (see test_risk_query_count);
+# rewritten by the benchmark when PV_RISK_BENCH_BASELINE is set
+QUERY_BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'query_baseline.json')
+
+with open(QUERY_BASELINE_PATH) as f:
+    QUERY_BASELINE = json.load(f)
+
+
+class PvRiskDatasetCommon(AccountTestInvoicingCommon):
+
+    @classmethod
+    def _generate_dataset(cls, company, size, seed=42):
+        """
+        Create `size` customers of `company`, each with a posted invoice (some
+        overdue), every third one with a posted credit note, and one confirmed
+        sale order per customer. Returns the customers.
+        """
+        rng = random.Random(seed)
+        env = cls.env(context=dict(cls.env.context, allowed_company_ids=company.ids))
+        today = fields.Date.context_today(env['res.partner'])
+        product = cls.product_a
+
+        partners = env['res.partner'].create([
+            {'name': 'PV Bench %s-%s' % (company.id, i), 'company_id': company.id, 'customer_rank': 1}
+            for i in range(size)
+        ])
+
+        move_vals = []
+        for i, partner in enumerate(partners):
+            invoice_date = today - timedelta(days=rng.randint(0, 90))
+            move_vals.append({
+                'move_type': 'out_invoice',
+                'company_id': company.id,
+                'partner_id': partner.id,
+                'invoice_date': invoice_date,
+                'invoice_date_due': invoice_date + timedelta(days=30),
+                'invoice_line_ids': [(0, 0, {
+                    'product_id': product.id,
+                    'quantity': 1,
+                    'price_unit': rng.randint(100, 5000),
+                    'tax_ids': [(6, 0, [])],
+                })],
+            })
+            if i % 3 == 0:
+                move_vals.append({
+                    'move_type': 'out_refund',
+                    'company_id': company.id,
+                    'partner_id': partner.id,
+                    'invoice_date': invoice_date,
+                    'invoice_line_ids': [(0, 0, {
+                        'product_id': product.id,
+                        'quantity': 1,
+                        'price_unit': rng.randint(10, 500),
+                        'tax_ids': [(6, 0, [])],
+                    })],
+                })
+        env['account.move'].create(move_vals).action_post()
+
+        orders = env['sale.order'].create([
+            {
+                'company_id': company.id,
+                'partner_id': partner.id,
+                'order_line': [(0, 0, {'product_id': product.id, 'product_uom_qty': 1, 'price_unit': 100})],
+            }
+            for partner in partners
+        ])
+        orders.action_confirm()
+        return partners
+
+    def _measure(self, func):
+        """Run `func` on a cold cache; return (query count, wall-clock seconds)."""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        before = self.cr.sql_log_count
+        started = time.perf_counter()
+        func()
+        self.env.flush_all()
+        return self.cr.sql_log_count - before, time.perf_counter() - started
+
+    def _entry_points(self, partners):
+        """Entry points under measure, keyed by name."""
+        Kpi = self.env['pv.debtor.kpi']
+        orders = self.env['sale.order'].search([('partner_id', 'in', partners.ids)])
+        return {
+            'partner_risk_snapshot': lambda: partners._recompute_risk_snapshot(),
+            'debtor_kpi_refresh': lambda: Kpi.action_refresh_from_partners(partners),
+            'sale_order_partner_risk_fields': lambda: orders.mapped('partner_risk_score'),
+            'action_confirm_risk_gate': lambda: orders._pv_risk_blocked_orders(),
+        }
+
+
+class PvRiskCustomersCommon(PvRiskDatasetCommon):
+    """`cls.partners`: QUERY_BASELINE['dataset_size'] customers of the current company."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.partners = cls._generate_dataset(cls.env.company, QUERY_BASELINE['dataset_size'])
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from odoo import fields
+from odoo.tests import tagged
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+
+@tagged('post_install', '-at_install')
+class TestCreditExposure(AccountTestInvoicingCommon):
+
+    def test_credit_limit_block_tax_included(self):
+        self.env['ir.config_parameter'].sudo().set_param('pv_sale_customer_risk.block_over_credit_limit', '1')
+        customer = self.env['res.partner'].create({'name': 'PV Limited', 'credit_limit': 1000.0})
+        order = self.env['sale.order'].create({
+            'partner_id': customer.id,
+            'order_line': [(0, 0, {
+                'product_id': self.product_a.id,
+                'product_uom_qty': 1,
+                'price_unit': 900.0,
+                'tax_id': [(6, 0, self.tax_sale_a.ids)],
+            })],
+        })
+        # 900 untaxed fits the limit, 1035 with taxes does not
+        self.assertEqual(order._pv_credit_limit_blocked_orders(), order)
+        order.order_line.tax_id = False
+        self.assertFalse(order._pv_credit_limit_blocked_orders())
+
+    def test_draft_invoice_not_counted_twice(self):
+        Partner = self.env['res.partner']
+        company = self.env.company
+        today = fields.Date.context_today(Partner)
+        self.product_a.invoice_policy = 'order'
+        customer = Partner.create({'name': 'PV Backlog'})
+        order = self.env['sale.order'].create({
+            'partner_id': customer.id,
+            'order_line': [(0, 0, {
+                'product_id': self.product_a.id,
+                'product_uom_qty': 2,
+                'price_unit': 300.0,
+                'tax_id': [(6, 0, self.tax_sale_a.ids)],
+            })],
+        })
+        order.action_confirm()
+        # Not delivered yet: the whole order counts, taxes included
+        agg = Partner._risk_receivable_aggregate(company, {customer.id}, today)[company.id, customer.id]
+        self.assertAlmostEqual(agg['to_invoice'], order.amount_total)
+        self.assertFalse(agg['draft_invoiced'])
+
+        order._create_invoices()
+        agg = Partner._risk_receivable_aggregate(company, {customer.id}, today)[company.id, customer.id]
+        self.assertAlmostEqual(agg['to_invoice'], 0.0)
+        self.assertAlmostEqual(agg['draft_invoiced'], order.amount_total)
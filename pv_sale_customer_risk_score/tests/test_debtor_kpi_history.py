@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+from ..models.debtor_kpi_history import HISTORY_DAILY_RETENTION_DAYS
+
+
+@tagged('post_install', '-at_install')
+class TestDebtorKpiHistory(AccountTestInvoicingCommon):
+
+    def test_history_compaction(self):
+        History = self.env['pv.debtor.kpi.history']
+        partner = self.partner_a
+        today = fields.Date.context_today(History)
+        old_month = (today - timedelta(days=HISTORY_DAILY_RETENTION_DAYS + 60)).replace(day=1)
+        row = {
+            'company_id': self.env.company.id, 'commercial_partner_id': partner.id,
+            'outstanding': 1.0, 'credit_open': 0.0, 'overdue': 0.0, 'credit_util_pct': 0.0,
+            'overdue_ratio': 0.0, 'orders_in_window': 0, 'risk_score': 0, 'risk_level': 'low',
+        }
+        for date in (old_month, old_month + timedelta(days=5), old_month + timedelta(days=9), today):
+            History._record_rows([row], date=date)
+
+        History.cron_compact_history()
+        points = History.search([('commercial_partner_id', '=', partner.id)])
+        self.assertEqual(
+            [(point.date, point.granularity) for point in points],
+            [(old_month + timedelta(days=9), 'month'), (today, 'day')],
+        )
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import tagged
+
+from ..models.debtor_kpi import KPI_CRON_JOB
+from .common import PvRiskCustomersCommon
+
+
+@tagged('post_install', '-at_install')
+class TestDebtorKpiRefresh(PvRiskCustomersCommon):
+
+    def test_kpi_matches_partner_snapshot(self):
+        self.env['pv.debtor.kpi'].action_refresh_from_partners(self.partners)
+        self.partners._recompute_risk_snapshot()
+        rows = self.env['pv.debtor.kpi'].search([('commercial_partner_id', 'in', self.partners.ids)])
+        self.assertEqual(len(rows), len(self.partners))
+        for row in rows:
+            partner = row.commercial_partner_id
+            self.assertEqual(row.risk_score, partner.risk_score)
+            self.assertEqual(row.risk_level, partner.risk_level)
+            self.assertAlmostEqual(row.credit_util_pct, partner.risk_credit_util_pct, places=2)
+            self.assertAlmostEqual(row.overdue_ratio, partner.risk_overdue_ratio, places=4)
+            self.assertEqual(row.orders_in_window, partner.risk_orders_90d)
+
+    def test_matview_matches_table(self):
+        self.env['pv.debtor.kpi'].action_refresh_full()
+        self.env['pv.debtor.kpi.view']._create_view()
+        columns = [
+            'outstanding', 'credit_open', 'overdue', 'credit_limit', 'credit_util_pct', 'overdue_ratio',
+            'orders_in_window', 'aging_current', 'aging_0_30', 'aging_31_60', 'aging_61_90',
+            'aging_90_plus', 'to_invoice', 'draft_invoiced', 'dso', 'avg_days_overdue', 'risk_score', 'risk_level',
+        ]
+        domain = [('commercial_partner_id', 'in', self.partners.ids)]
+        table = {
+            (row['company_id'][0], row['commercial_partner_id'][0]): row
+            for row in self.env['pv.debtor.kpi'].search_read(domain, columns + ['company_id', 'commercial_partner_id'])
+        }
+        view = {
+            (row['company_id'][0], row['commercial_partner_id'][0]): row
+            for row in self.env['pv.debtor.kpi.view'].search_read(domain, columns + ['company_id', 'commercial_partner_id'])
+        }
+        self.assertEqual(set(table), set(view))
+        for key, row in table.items():
+            for column in columns:
+                if isinstance(row[column], float):
+                    self.assertAlmostEqual(row[column], view[key][column], places=2, msg=column)
+                else:
+                    self.assertEqual(row[column], view[key][column], column)
+
+    def test_contacts_roll_up_to_commercial_entity(self):
+        Kpi = self.env['pv.debtor.kpi']
+        company_partner = self.env['res.partner'].create({'name': 'PV Holding', 'is_company': True})
+        contacts = self.env['res.partner'].create([
+            {'name': 'PV Contact %s' % i, 'parent_id': company_partner.id, 'customer_rank': 1}
+            for i in range(3)
+        ])
+        order = self.env['sale.order'].create({
+            'partner_id': contacts[1].id,
+            'order_line': [(0, 0, {'product_id': self.product_a.id, 'product_uom_qty': 1, 'price_unit': 100})],
+        })
+        order.action_confirm()
+        self.assertEqual(order.pv_commercial_partner_id, company_partner)
+
+        entities = self.env['res.partner'].search(Kpi._customer_entity_domain(company_partner.ids))
+        self.assertEqual(entities, company_partner)
+        Kpi.action_refresh_from_partners(entities)
+        row = Kpi.search([('commercial_partner_id', '=', company_partner.id)])
+        self.assertEqual(len(row), 1)
+        self.assertEqual(row.orders_in_window, 1)
+
+    def test_delta_refresh_keeps_running_transactions(self):
+        Kpi = self.env['pv.debtor.kpi']
+        customer = self.partners[1]
+        Kpi.action_refresh_full()
+        mark = Kpi._get_high_water_mark()
+        # The test transaction is still running: the mark stays below its start
+        self.assertLess(mark, self.env.cr.now())
+        before = Kpi.search([('commercial_partner_id', '=', customer.id)]).outstanding
+
+        # Written after the full run, dated at the transaction start
+        invoice = self.init_invoice('out_invoice', partner=customer, amounts=[250.0], post=True)
+        self.assertIn(customer.id, Kpi._delta_commercial_partner_ids(mark, fields.Datetime.now()))
+        Kpi.action_refresh_delta()
+        row = Kpi.search([('commercial_partner_id', '=', customer.id)])
+        self.assertAlmostEqual(row.outstanding, before + invoice.amount_total)
+        self.assertLessEqual(Kpi._get_high_water_mark(), self.env.cr.now())
+
+    def test_delta_ignores_snapshot_recompute(self):
+        Kpi = self.env['pv.debtor.kpi']
+        Queue = self.env['pv.risk.dirty.partner']
+        customer = self.partners[2]
+        Kpi.action_refresh_full()
+        mark = Kpi._get_high_water_mark()
+
+        # Recomputing snapshots rewrites every customer, not their KPIs
+        self.partners.action_recompute_risk()
+        self.env.flush_all()
+        self.assertFalse(set(self.partners.ids) & Kpi._delta_commercial_partner_ids(mark, fields.Datetime.now()))
+
+        # A credit limit change goes through the queue instead
+        Queue.search([]).unlink()
+        customer.credit_limit = 4321.0
+        self.assertEqual(Queue.search([]).commercial_partner_id, customer)
+        Queue.search([])._drain()
+        self.assertEqual(Kpi.search([('commercial_partner_id', '=', customer.id)]).credit_limit, 4321.0)
+
+    def test_cron_refresh_resumes_from_cursor(self):
+        Kpi = self.env['pv.debtor.kpi']
+        self.env['ir.config_parameter'].sudo().set_param('pv_sale_customer_risk.cron_batch_size', '10')
+        domain = [('commercial_partner_id', 'in', self.partners.ids)]
+        Kpi.search(domain).unlink()
+
+        # Out of time after the first chunk: progress is kept on the cursor
+        with patch.object(type(Kpi), '_pv_cron_time_budget', lambda self: 1e-9):
+            Kpi.cron_refresh_all(full=True)
+        cursor = self.env['pv.risk.cron.cursor']._get(KPI_CRON_JOB)
+        self.assertTrue(cursor.last_id)
+        self.assertTrue(cursor.run_started)
+        self.assertLess(Kpi.search_count(domain), len(self.partners))
+        run_started = cursor.run_started
+
+        Kpi.cron_refresh_all()
+        self.assertEqual(cursor.last_id, 0)
+        self.assertFalse(cursor.run_started)
+        self.assertEqual(Kpi.search_count(domain), len(self.partners))
+        self.assertEqual(
+            fields.Datetime.to_string(Kpi._get_high_water_mark()),
+            fields.Datetime.to_string(run_started),
+        )
+
+    def test_full_refresh_deletes_stale_rows(self):
+        Kpi = self.env['pv.debtor.kpi']
+        company_b = self.setup_other_company()['company']
+        customer = self.partners[0]
+        former = self.env['res.partner'].create({'name': 'PV Former Customer', 'customer_rank': 1})
+        Kpi.action_refresh_full()
+        # Rows left by an older pairing, and by a customer who is no longer one
+        Kpi.create({'company_id': company_b.id, 'commercial_partner_id': customer.id})
+        former.customer_rank = 0
+        self.assertTrue(Kpi.search([('commercial_partner_id', '=', former.id)]))
+
+        Kpi.action_refresh_full()
+        rows = Kpi.search([('commercial_partner_id', 'in', (customer | former).ids)])
+        self.assertEqual(rows.mapped(lambda r: (r.company_id, r.commercial_partner_id)), [(customer.company_id, customer)])
+
+        # The chunked cron run cleans up the same rows
+        Kpi.create({'company_id': company_b.id, 'commercial_partner_id': customer.id})
+        Kpi.create({'company_id': self.env.company.id, 'commercial_partner_id': former.id})
+        Kpi.cron_refresh_all(full=True)
+        self.assertEqual(Kpi.search([('commercial_partner_id', 'in', (customer | former).ids)]), rows)
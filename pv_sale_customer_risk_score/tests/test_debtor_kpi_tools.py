@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import PvRiskCustomersCommon
+
+
+@tagged('post_install', '-at_install')
+class TestDebtorKpiTools(PvRiskCustomersCommon):
+
+    def test_streamed_export_follows_domain(self):
+        self.env['pv.debtor.kpi'].action_refresh_from_partners(self.partners)
+        domain = [('commercial_partner_id', 'in', self.partners[:7].ids)]
+        wizard = self.env['pv.debtor.kpi.export'].with_context(
+            active_model='pv.debtor.kpi', active_domain=domain,
+        ).create({'group_by': 'risk_level', 'include_aging': True})
+        headers, rows = wizard._export_stream()
+        rows = list(rows)
+        self.assertEqual(len(rows), 7)
+        self.assertTrue(all(len(row) == len(headers) for row in rows))
+        self.assertEqual(
+            {row[0] for row in rows},
+            set(self.partners[:7].mapped('complete_name')),
+        )
+
+    def test_simulation_transitions(self):
+        Kpi = self.env['pv.debtor.kpi']
+        Kpi.action_refresh_from_partners(self.partners)
+        domain = [('commercial_partner_id', 'in', self.partners.ids)]
+        unchanged = Kpi.simulate_rescoring({}, domain)
+        self.assertEqual(unchanged['total'], len(self.partners))
+        self.assertFalse(unchanged['changed'])
+
+        all_low = Kpi.simulate_rescoring({'threshold_low': 1000, 'threshold_high': 1000}, domain)
+        self.assertEqual(all_low['total'], sum(row['low'] for row in all_low['matrix'].values()))
+        self.assertEqual(
+            len(all_low['changed']),
+            all_low['matrix']['medium']['low'] + all_low['matrix']['high']['low'],
+        )
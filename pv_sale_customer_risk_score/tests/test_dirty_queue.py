@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from .common import PvRiskCustomersCommon
+
+
+@tagged('post_install', '-at_install')
+class TestDirtyQueue(PvRiskCustomersCommon):
+
+    def test_dirty_queue_customers_only(self):
+        Queue = self.env['pv.risk.dirty.partner']
+        Kpi = self.env['pv.debtor.kpi']
+        Queue.search([]).unlink()
+        customer = self.partners[0]
+        vendor = self.env['res.partner'].create({'name': 'PV Vendor'})
+        self.init_invoice('in_invoice', partner=vendor, amounts=[100.0], post=True)
+        self.assertFalse(Queue.search([]))
+
+        self.init_invoice('out_invoice', partner=customer, amounts=[100.0], post=True)
+        self.assertEqual(Queue.search([]).commercial_partner_id, customer)
+
+        # Pairs of non-customers queued anyway are dropped when draining
+        Queue._enqueue([(self.env.company.id, vendor.id)])
+        Kpi.search([('commercial_partner_id', 'in', (customer | vendor).ids)]).unlink()
+        Queue.cron_drain_queue()
+        self.assertFalse(Queue.search([]))
+        rows = Kpi.search([('commercial_partner_id', 'in', (customer | vendor).ids)])
+        self.assertEqual(rows.commercial_partner_id, customer)
+
+    def test_dirty_queue_keeps_change_enqueued_during_drain(self):
+        Queue = self.env['pv.risk.dirty.partner']
+        Kpi = self.env['pv.debtor.kpi']
+        Queue.search([]).unlink()
+        pair = (self.env.company.id, self.partners[0].id)
+        Queue._enqueue([pair])
+        refresh_chunk = type(Kpi)._refresh_chunk
+
+        def refresh_and_change(kpi, company_id, cp_ids, now_dt):
+            # An invoice of the customer is posted while its KPIs are computed
+            Queue._enqueue([pair])
+            return refresh_chunk(kpi, company_id, cp_ids, now_dt)
+
+        with patch.object(type(Kpi), '_refresh_chunk', refresh_and_change):
+            Queue.search([])._drain()
+        entry = Queue.search([])
+        self.assertEqual((entry.company_id.id, entry.commercial_partner_id.id), pair)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from odoo import fields
+from odoo.tests import tagged
+
+from ..models.res_partner import RISK_SNAPSHOT_FIELDS
+from ..tools import risk_cache
+from .common import PvRiskCustomersCommon
+
+
+@tagged('post_install', '-at_install')
+class TestPartnerRiskSnapshot(PvRiskCustomersCommon):
+
+    def test_contacts_follow_entity_snapshot(self):
+        Partner = self.env['res.partner']
+        entity = Partner.create({'name': 'PV Parent Co', 'is_company': True, 'customer_rank': 1, 'credit_limit': 1000.0})
+        contact = Partner.create({'name': 'PV Parent Contact', 'parent_id': entity.id, 'customer_rank': 1})
+        self.init_invoice('out_invoice', partner=entity, amounts=[900.0], post=True)
+        self.env.flush_all()
+        self.assertTrue(entity.risk_credit_util_pct)
+        self.assertEqual(
+            [contact[fname] for fname in RISK_SNAPSHOT_FIELDS],
+            [entity[fname] for fname in RISK_SNAPSHOT_FIELDS],
+        )
+
+    def test_shared_customer_snapshot_independent_of_company(self):
+        Partner = self.env['res.partner']
+        company_a = self.env.company
+        company_b = self.setup_other_company()['company']
+        customer = Partner.create({'name': 'PV Shared', 'company_id': False, 'customer_rank': 1})
+        customer.with_company(company_a).credit_limit = 600.0
+        self.init_invoice('out_invoice', partner=customer, amounts=[500.0], post=True)
+
+        results = set()
+        for company in (company_b, company_a, company_b):
+            customer.with_company(company)._recompute_risk_snapshot()
+            level = Partner.with_company(company)._risk_levels_for_gate(customer, 0)[customer.id]
+            results.add((customer.risk_score, customer.risk_credit_util_pct, level))
+        self.assertEqual(len(results), 1)
+        # Scored in the company where the customer is active
+        self.assertTrue(customer.risk_credit_util_pct)
+
+    def test_quotation_edit_keeps_snapshot(self):
+        customer = self.env['res.partner'].create({'name': 'PV Quotation', 'customer_rank': 1, 'credit_limit': 10000.0})
+        order = self.env['sale.order'].create({
+            'partner_id': customer.id,
+            'order_line': [(0, 0, {'product_id': self.product_a.id, 'product_uom_qty': 1, 'price_unit': 100})],
+        })
+        self.env.flush_all()
+        field = customer._fields['risk_credit_util_pct']
+
+        # Draft line edits do not rescore the customer
+        order.order_line.price_unit = 1000.0
+        self.assertFalse(self.env.is_to_compute(field, customer))
+        self.env.flush_all()
+        self.assertFalse(customer.risk_credit_util_pct)
+
+        # Confirming the order adds its to-invoice exposure
+        order.action_confirm()
+        self.env.flush_all()
+        self.assertAlmostEqual(customer.risk_credit_util_pct, order.amount_total / 100.0)
+
+    def test_snapshot_cache_invalidated_on_post(self):
+        partner = self.partners[0]
+        company = self.env.company
+        partner._risk_snapshot_cached(company)
+        with self.assertQueryCount(0):
+            partner._risk_snapshot_cached(company)
+
+        invoice = self.init_invoice('out_invoice', partner=partner, amounts=[100.0])
+        invoice.action_post()
+        key = (self.env.cr.dbname, company.id, partner.id)
+        self.assertIsNone(risk_cache.snapshot_cache.get(key))
+
+    def test_conversion_rates_cached(self):
+        Partner = self.env['res.partner']
+        company = self.env.company
+        currency = self.setup_other_currency('EUR')
+        today = fields.Date.context_today(Partner)
+        risk_cache.rate_cache.clear()
+        rates = Partner._risk_conversion_rates(company, currency | company.currency_id, today)
+        self.assertEqual(rates[company.currency_id.id], 1.0)
+        self.assertAlmostEqual(
+            rates[currency.id],
+            currency._get_conversion_rate(currency, company.currency_id, company, today),
+        )
+        with self.assertQueryCount(0):
+            Partner._risk_conversion_rates(company, currency, today)
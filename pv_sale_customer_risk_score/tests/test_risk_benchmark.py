@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in benchmark of the risk entry points on larger datasets:
+
+    PV_RISK_BENCH_SIZES=100,10000,100000 \
+    PV_RISK_BENCH_OUTPUT=/tmp/pv_risk_bench.json \
+    odoo-bin -d db -i pv_sale_customer_risk_score --test-tags /pv_sale_customer_risk_score:pv_risk_bench
+
+which writes one JSON record per (size, entry point) with query count and
+wall-clock time. With PV_RISK_BENCH_BASELINE=<path to query_baseline.json>
+the query counts checked by test_risk_query_count are measured again and
+written there, to be committed with the change that moves them.
+"""
+import json
+import os
+
+from odoo.tests import tagged
+
+from .common import QUERY_BASELINE, PvRiskDatasetCommon
+
+
+@tagged('-standard', 'pv_risk_bench')
+class TestRiskBenchmark(PvRiskDatasetCommon):
+
+    def test_benchmark(self):
+        sizes = [int(size) for size in os.environ.get('PV_RISK_BENCH_SIZES', '100').split(',') if size]
+        company = self.setup_other_company()['company']
+        results = []
+        generated = self.env['res.partner']
+        for size in sorted(sizes):
+            generated |= self._generate_dataset(company, size - len(generated), seed=size)
+            for name, func in self._entry_points(generated).items():
+                queries, elapsed = self._measure(func)
+                results.append({'size': size, 'entry_point': name, 'queries': queries, 'seconds': round(elapsed, 4)})
+
+        output = os.environ.get('PV_RISK_BENCH_OUTPUT')
+        if output:
+            with open(output, 'w') as f:
+                json.dump(results, f, indent=2)
+
+        # Scaling must come from the database, never from per-partner queries
+        for name in {result['entry_point'] for result in results}:
+            counts = {result['queries'] for result in results if result['entry_point'] == name}
+            self.assertEqual(len(counts), 1, "%s query count grows with size: %s" % (name, sorted(counts)))
+
+    def test_query_baseline(self):
+        baseline_path = os.environ.get('PV_RISK_BENCH_BASELINE')
+        if not baseline_path:
+            self.skipTest("PV_RISK_BENCH_BASELINE is not set")
+        # Same dataset and conditions as TestRiskQueryCount
+        self.env['ir.config_parameter'].sudo().set_param('pv_sale_customer_risk.block_sale_on_high', '1')
+        partners = self._generate_dataset(self.env.company, QUERY_BASELINE['dataset_size'])
+        queries = {}
+        for name, func in self._entry_points(partners).items():
+            func()  # warm the configuration cache
+            queries[name], _elapsed = self._measure(func)
+        with open(baseline_path, 'w') as f:
+            json.dump({'dataset_size': QUERY_BASELINE['dataset_size'], 'queries': queries}, f, indent=4)
+            f.write('\n')
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import PvRiskCustomersCommon
+
+
+@tagged('post_install', '-at_install')
+class TestRiskPerfLog(PvRiskCustomersCommon):
+
+    def test_nested_profiled_measurements(self):
+        self.env['ir.config_parameter'].sudo().set_param('pv_sale_customer_risk.perf_log', '1')
+        PerfLog = self.env['pv.risk.perf.log'].with_context(pv_risk_profile=True)
+        before = PerfLog.search([])
+        with PerfLog._measure('confirm_gate', 1):
+            with PerfLog._measure('partner_snapshot', 1):
+                self.partners[:1].mapped('display_name')
+        logs = PerfLog.search([]) - before
+        outer = logs.filtered(lambda log: log.operation == 'confirm_gate')
+        inner = logs.filtered(lambda log: log.operation == 'partner_snapshot')
+        self.assertEqual((len(outer), len(inner)), (1, 1))
+        self.assertTrue(outer.profile_attachment_id)
+        self.assertFalse(inner.profile_attachment_id)
+
+    def test_perf_log_records_refresh(self):
+        self.env['ir.config_parameter'].sudo().set_param('pv_sale_customer_risk.perf_log', '1')
+        PerfLog = self.env['pv.risk.perf.log']
+        before = PerfLog.search([])
+        self.env['pv.debtor.kpi'].action_refresh_from_partners(self.partners)
+        log = PerfLog.search([('operation', '=', 'debtor_kpi_refresh')]) - before
+        self.assertEqual(len(log), 1)
+        self.assertEqual(log.partners, len(self.partners))
+        self.assertGreater(log.query_count, 0)
+        self.assertAlmostEqual(log.queries_per_partner, log.query_count / len(self.partners), delta=0.01)
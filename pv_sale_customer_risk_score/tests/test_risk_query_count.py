@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Query-count regression suite: fails as soon as an entry point issues queries
+per partner (the count must not depend on the batch size) or exceeds the
+committed baseline (query_baseline.json, see test_risk_benchmark to refresh
+it).
+"""
+from odoo.tests import tagged
+
+from .common import QUERY_BASELINE, PvRiskCustomersCommon
+
+
+@tagged('post_install', '-at_install')
+class TestRiskQueryCount(PvRiskCustomersCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env['ir.config_parameter'].sudo().set_param('pv_sale_customer_risk.block_sale_on_high', '1')
+
+    def test_query_count_constant_in_batch_size(self):
+        small = self._entry_points(self.partners[:5])
+        large = self._entry_points(self.partners)
+        for name in small:
+            small_count, _elapsed = self._measure(small[name])
+            large_count, _elapsed = self._measure(large[name])
+            self.assertEqual(
+                small_count, large_count,
+                "%s issues per-partner queries (%s for 5 partners, %s for %s)"
+                % (name, small_count, large_count, len(self.partners)),
+            )
+
+    def test_query_budget_per_entry_point(self):
+        for name, func in self._entry_points(self.partners).items():
+            with self.subTest(entry_point=name):
+                func()  # warm the configuration cache
+                self.env.flush_all()
+                self.env.invalidate_all()
+                with self.assertQueryCount(QUERY_BASELINE['queries'][name]):
+                    func()
+                    self.env.flush_all()
+
+    def test_risk_gate_single_query(self):
+        orders = self.env['sale.order'].search([('partner_id', 'in', self.partners.ids)])
+        orders._pv_risk_blocked_orders()  # warm the config cache and snapshots
+        orders.partner_id.commercial_partner_id.mapped('display_name')
+        with self.assertQueryCount(1):
+            orders._pv_risk_blocked_orders()
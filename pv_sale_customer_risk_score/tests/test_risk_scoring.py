@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import random
+
+from odoo.tests import tagged
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+from ..tools import risk_scoring
+
+
+@tagged('post_install', '-at_install')
+class TestRiskScoring(AccountTestInvoicingCommon):
+
+    def test_scoring_kernel_fallback_identical(self):
+        if risk_scoring.numpy is None:
+            self.skipTest("numpy is not installed")
+        rng = random.Random(7)
+        size = 5000
+        outstanding = [rng.choice([0.0, rng.uniform(0, 1e5)]) for _i in range(size)]
+        overdue = [amount * rng.random() for amount in outstanding]
+        credit_open = [rng.choice([0.0, rng.uniform(0, 1e4)]) for _i in range(size)]
+        credit_limit = [rng.choice([0.0, rng.uniform(1, 2e5)]) for _i in range(size)]
+        orders = [rng.randint(0, 12) for _i in range(size)]
+        config = self.env['res.partner']._get_risk_config(self.env.company)
+
+        vectorized = risk_scoring.exposure_ratios(outstanding, overdue, credit_open, credit_limit, use_numpy=True)
+        fallback = risk_scoring.exposure_ratios(outstanding, overdue, credit_open, credit_limit, use_numpy=False)
+        self.assertEqual(vectorized, fallback)
+        self.assertEqual(
+            risk_scoring.score_levels(*vectorized, orders, config, use_numpy=True),
+            risk_scoring.score_levels(*fallback, orders, config, use_numpy=False),
+        )
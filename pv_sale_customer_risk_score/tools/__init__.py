@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import risk_cache
+from . import risk_scoring
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Per-worker LRU caches with a time-to-live.
+
+snapshot_cache: customer risk snapshots keyed by (database, company_id,
+    commercial_partner_id). Invalidations (see pv.risk.dirty.partner._enqueue)
+    reach the worker that handled the change immediately, other workers see
+    the change once the entry expires, so the TTL bounds the staleness.
+rate_cache: currency rates keyed by (database, company_id, currency_id, date),
+    cleared when a refresh starts so each refresh reads a rate once.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 60.0
+DEFAULT_SIZE = 2048
+DEFAULT_RATE_TTL = 600.0
+
+
+class LruTtlCache:
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, ttl=DEFAULT_TTL):
+        """Cached value of `key`, or None when missing or older than `ttl` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] > ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, size=DEFAULT_SIZE):
+        """Store `value`, evicting the least recently used entries beyond `size`."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max(1, size):
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+snapshot_cache = LruTtlCache()
+rate_cache = LruTtlCache()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Batch scoring kernel shared by the partner snapshot and the Debtor KPI refresh.
+
+Every function takes parallel sequences (one item per customer) and returns
+plain Python lists. NumPy is used when available; the pure-Python fallback
+performs the same floating point operations in the same order, so both paths
+return identical results.
+
+`params` is any object exposing weight_credit, weight_overdue,
+weight_activity, target_orders, threshold_low and threshold_high
+(e.g. the RiskConfig tuple of res.partner).
+"""
+import math
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - numpy is optional
+    numpy = None
+
+# (cut-off, share of the weight) – strictly greater than the cut-off, first match wins
+CREDIT_UTIL_BANDS = ((100.0, 1.0), (80.0, 2.0 / 3.0), (50.0, 1.0 / 3.0))
+OVERDUE_RATIO_BANDS = ((0.20, 1.0), (0.05, 0.4))
+
+
+def _use_numpy(use_numpy):
+    return numpy is not None if use_numpy is None else (use_numpy and numpy is not None)
+
+
+def exposure_ratios(outstanding, overdue, credit_open, credit_limit, pending=None, use_numpy=None):
+    """
+    Credit utilization % and overdue ratio:
+      - credit_util_pct = max(0, outstanding + pending - credit_open) / credit_limit * 100
+      - overdue_ratio   = max(0, overdue - credit_open) / outstanding
+    `pending` is the exposure not posted yet (orders to invoice, drafts), 0
+    when omitted. Both are 0 when their denominator is not positive.
+    """
+    if pending is None:
+        pending = [0.0] * len(outstanding)
+    if _use_numpy(use_numpy):
+        outstanding = numpy.asarray(outstanding, dtype=float)
+        overdue = numpy.asarray(overdue, dtype=float)
+        credit_open = numpy.asarray(credit_open, dtype=float)
+        credit_limit = numpy.asarray(credit_limit, dtype=float)
+        pending = numpy.asarray(pending, dtype=float)
+        net = numpy.maximum(0.0, outstanding + pending - credit_open)
+        numerator = numpy.maximum(0.0, overdue - credit_open)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            util = numpy.where(credit_limit > 0, net / credit_limit * 100.0, 0.0)
+            ratio = numpy.where(outstanding > 0, numerator / outstanding, 0.0)
+        return util.tolist(), ratio.tolist()
+
+    util, ratio = [], []
+    for out, due, cn, limit, extra in zip(outstanding, overdue, credit_open, credit_limit, pending):
+        net = max(0.0, out + extra - cn)
+        numerator = max(0.0, due - cn)
+        util.append(net / limit * 100.0 if limit > 0 else 0.0)
+        ratio.append(numerator / out if out > 0 else 0.0)
+    return util, ratio
+
+
+def _band(value, bands):
+    for cut_off, share in bands:
+        if value > cut_off:
+            return share
+    return 0.0
+
+
+def score_levels(credit_util_pct, overdue_ratio, orders_in_window, params, use_numpy=None):
+    """
+    Weighted score and level for each customer:
+      score = weight_credit   * band(credit_util_pct)
+            + weight_overdue  * band(overdue_ratio)
+            + weight_activity * shortfall of orders_in_window against target_orders
+    rounded half up; level from threshold_low / threshold_high (score ≥).
+    """
+    w_credit = float(params.weight_credit or 0)
+    w_overdue = float(params.weight_overdue or 0)
+    w_activity = float(params.weight_activity or 0)
+    target = float(params.target_orders or 0)
+
+    if _use_numpy(use_numpy):
+        util = numpy.asarray(credit_util_pct, dtype=float)
+        ratio = numpy.asarray(overdue_ratio, dtype=float)
+        orders = numpy.asarray(orders_in_window, dtype=float)
+
+        credit_share = numpy.select(
+            [util > cut for cut, _share in CREDIT_UTIL_BANDS],
+            [share for _cut, share in CREDIT_UTIL_BANDS],
+            0.0,
+        )
+        overdue_share = numpy.select(
+            [ratio > cut for cut, _share in OVERDUE_RATIO_BANDS],
+            [share for _cut, share in OVERDUE_RATIO_BANDS],
+            0.0,
+        )
+        if target > 0:
+            activity_share = numpy.maximum(0.0, target - orders) / target
+        else:
+            activity_share = numpy.zeros_like(orders)
+
+        raw = w_credit * credit_share + w_overdue * overdue_share + w_activity * activity_share
+        scores = numpy.floor(raw + 0.5).astype(int)
+        levels = numpy.where(
+            scores >= params.threshold_high, "high",
+            numpy.where(scores >= params.threshold_low, "medium", "low"),
+        )
+        return scores.tolist(), levels.tolist()
+
+    scores, levels = [], []
+    for util, ratio, orders in zip(credit_util_pct, overdue_ratio, orders_in_window):
+        credit_share = _band(util, CREDIT_UTIL_BANDS)
+        overdue_share = _band(ratio, OVERDUE_RATIO_BANDS)
+        activity_share = max(0.0, target - orders) / target if target > 0 else 0.0
+        raw = w_credit * credit_share + w_overdue * overdue_share + w_activity * activity_share
+        score = int(math.floor(raw + 0.5))
+        scores.append(score)
+        if score >= params.threshold_high:
+            levels.append("high")
+        elif score >= params.threshold_low:
+            levels.append("medium")
+        else:
+            levels.append("low")
+    return scores, levels
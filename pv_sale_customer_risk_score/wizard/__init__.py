@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import debtor_kpi_export
+from . import risk_simulation
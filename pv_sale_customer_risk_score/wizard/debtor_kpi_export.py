@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+from odoo.tools.safe_eval import safe_eval
+
+from ..models.debtor_kpi import _AGING_COLUMNS
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_FETCH_SIZE = 2000
+EXPORT_MODELS = ("pv.debtor.kpi", "pv.debtor.kpi.view")
+# KPI columns always exported, in order
+_EXPORT_KPI_COLUMNS = (
+    "outstanding",
+    "credit_open",
+    "overdue",
+    "to_invoice",
+    "credit_limit",
+    "credit_util_pct",
+    "overdue_ratio",
+    "orders_in_window",
+    "risk_score",
+    "risk_level",
+    "last_updated",
+)
+_GROUP_BY_COLUMNS = {
+    "company": ("company_id",),
+    "risk_level": ("risk_level",),
+    "company_risk_level": ("company_id", "risk_level"),
+}
+
+
+class PvDebtorKpiExport(models.TransientModel):
+    """
+    Export of the Debtors snapshot that streams rows from a server-side
+    cursor (see controllers/main.py) instead of loading records: memory use
+    does not depend on the number of customers.
+    """
+
+    _name = "pv.debtor.kpi.export"
+    _description = "Debtors Export"
+
+    res_model = fields.Char(required=True, default=lambda self: self._default_res_model())
+    scope = fields.Selection(
+        [("domain", "All records matching the search"), ("selection", "Selected records")],
+        required=True,
+        default=lambda self: self._default_scope(),
+    )
+    domain = fields.Char(default=lambda self: repr(self.env.context.get("active_domain") or []))
+    active_ids = fields.Char(default=lambda self: repr(self.env.context.get("active_ids") or []))
+    file_format = fields.Selection([("csv", "CSV"), ("xlsx", "XLSX")], required=True, default="csv")
+    group_by = fields.Selection(
+        [
+            ("company", "Company"),
+            ("risk_level", "Risk Level"),
+            ("company_risk_level", "Company, then Risk Level"),
+        ],
+        string="Group Rows By",
+        default=lambda self: self._default_group_by(),
+        help="Rows are sorted by these columns first, as in a grouped list.",
+    )
+    include_partner_ref = fields.Boolean(string="Customer Reference")
+    include_salesperson = fields.Boolean(string="Salesperson")
+    include_aging = fields.Boolean(string="Aging, DSO and Days Overdue")
+
+    @api.model
+    def _default_res_model(self):
+        model = self.env.context.get("active_model")
+        return model if model in EXPORT_MODELS else "pv.debtor.kpi"
+
+    @api.model
+    def _default_scope(self):
+        context = self.env.context
+        return "selection" if context.get("active_ids") and not context.get("active_domain") else "domain"
+
+    @api.model
+    def _default_group_by(self):
+        group_by = self.env.context.get("group_by") or []
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        fnames = tuple(g.split(":")[0] for g in group_by)
+        for key, columns in _GROUP_BY_COLUMNS.items():
+            if fnames == columns:
+                return key
+        return False
+
+    def _export_domain(self):
+        self.ensure_one()
+        if self.scope == "selection":
+            return [("id", "in", safe_eval(self.active_ids or "[]"))]
+        return safe_eval(self.domain or "[]")
+
+    def _export_columns(self, aliases):
+        """[(header, SQL expression, field or None)] of the exported columns."""
+        Model = self.env[self.res_model]
+
+        def column(alias, fname):
+            return SQL.identifier(aliases[alias], fname)
+
+        columns = [(_("Customer"), column("partner", "complete_name"), None)]
+        if self.include_partner_ref:
+            columns.append((_("Reference"), column("partner", "ref"), None))
+        if self.include_salesperson:
+            columns.append((_("Salesperson"), column("salesperson", "name"), None))
+        columns.append((_("Company"), column("company", "name"), None))
+        fnames = list(_EXPORT_KPI_COLUMNS)
+        if self.include_aging:
+            fnames[3:3] = _AGING_COLUMNS
+        for fname in fnames:
+            field = Model._fields[fname]
+            columns.append((field._description_string(self.env), column("kpi", fname), field))
+        return columns
+
+    def _export_query(self):
+        """
+        (SQL, columns) of the export: the search domain, record rules and
+        grouping order of the KPI model, plus the joins to the display names.
+        """
+        self.ensure_one()
+        if self.res_model not in EXPORT_MODELS:
+            raise UserError(_("Unsupported export model %s.", self.res_model))
+        Model = self.env[self.res_model]
+        Model.check_access("read")
+        order = ", ".join(_GROUP_BY_COLUMNS.get(self.group_by, ()) + (Model._order,))
+        query = Model._search(self._export_domain(), order=order)
+
+        def join(kind, alias, link, table, column):
+            target = query.make_alias(aliases[alias], link)
+            query.add_join(kind, target, table, SQL(
+                "%s = %s", SQL.identifier(aliases[alias], column), SQL.identifier(target, "id"),
+            ))
+            return target
+
+        aliases = {"kpi": query.table}
+        aliases["partner"] = join("JOIN", "kpi", "pv_export_partner", "res_partner", "commercial_partner_id")
+        aliases["company"] = join("JOIN", "kpi", "pv_export_company", "res_company", "company_id")
+        if self.include_salesperson:
+            aliases["user"] = join("LEFT JOIN", "partner", "pv_export_user", "res_users", "user_id")
+            aliases["salesperson"] = join("LEFT JOIN", "user", "pv_export_salesperson", "res_partner", "partner_id")
+        columns = self._export_columns(aliases)
+        return query.select(*(expression for _header, expression, _field in columns)), columns
+
+    def _export_stream(self):
+        """
+        Return (headers, rows): rows is an iterator of value lists read in
+        chunks through a server-side cursor, on a database cursor of its own
+        (the response is streamed after the request's cursor is closed).
+        """
+        query, columns = self._export_query()
+        selections = {
+            index: dict(field._description_selection(self.env))
+            for index, (_header, _expression, field) in enumerate(columns)
+            if field and field.type == "selection"
+        }
+        registry = self.env.registry
+
+        def rows():
+            with registry.cursor() as cr:
+                cr.execute(SQL("DECLARE pv_debtor_kpi_export NO SCROLL CURSOR FOR %s", query))
+                while True:
+                    cr.execute(SQL("FETCH FORWARD %s FROM pv_debtor_kpi_export", EXPORT_FETCH_SIZE))
+                    chunk = cr.fetchall()
+                    if not chunk:
+                        break
+                    for row in chunk:
+                        row = list(row)
+                        for index, labels in selections.items():
+                            row[index] = labels.get(row[index], row[index] or "")
+                        yield row
+
+        return [header for header, _expression, _field in columns], rows()
+
+    def _export_filename(self):
+        return "debtors_%s.%s" % (fields.Date.context_today(self), self.file_format)
+
+    def action_export(self):
+        self.ensure_one()
+        # Fail early (access, domain) instead of in the streamed response
+        self._export_query()
+        return {
+            "type": "ir.actions.act_url",
+            "url": "/pv_sale_customer_risk/debtors/export/%s" % self.id,
+            "target": "self",
+        }
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+from markupsafe import Markup, escape
+
+from odoo import api, fields, models, _
+from odoo.exceptions import ValidationError
+
+from ..models.debtor_kpi import RISK_LEVELS, SIMULATION_PARAMS
+
+# Changed customers kept as wizard lines (the API returns all of them)
+SIMULATION_LINE_LIMIT = 2000
+
+
+class PvRiskSimulation(models.TransientModel):
+    """
+    What-if wizard: candidate thresholds and weights are applied to the
+    stored Debtor KPI rows in memory (pv.debtor.kpi.mixin.simulate_rescoring)
+    and the resulting level transitions are shown. Settings are not changed.
+    The candidates start from the active company's settings, so only that
+    company's customers are re-scored.
+    """
+
+    _name = "pv.risk.simulation"
+    _description = "Customer Risk What-If Simulation"
+
+    company_id = fields.Many2one(
+        "res.company",
+        required=True,
+        readonly=True,
+        default=lambda self: self.env.company,
+    )
+    threshold_low = fields.Float(
+        string="Low threshold (score ≥)",
+        default=lambda self: self._default_param("threshold_low"),
+    )
+    threshold_high = fields.Float(
+        string="High threshold (score ≥)",
+        default=lambda self: self._default_param("threshold_high"),
+    )
+    weight_credit = fields.Integer(
+        string="Weight: Credit Utilization",
+        default=lambda self: self._default_param("weight_credit"),
+    )
+    weight_overdue = fields.Integer(
+        string="Weight: Overdue Ratio",
+        default=lambda self: self._default_param("weight_overdue"),
+    )
+    weight_activity = fields.Integer(
+        string="Weight: Inactivity",
+        default=lambda self: self._default_param("weight_activity"),
+    )
+    target_orders = fields.Integer(
+        string="Target orders in window",
+        default=lambda self: self._default_param("target_orders"),
+    )
+
+    total = fields.Integer(string="Customers Scored", readonly=True)
+    changed_count = fields.Integer(string="Customers Changing Level", readonly=True)
+    transition_html = fields.Html(string="Level Transitions", readonly=True, sanitize=False)
+    line_ids = fields.One2many("pv.risk.simulation.line", "simulation_id", string="Affected Customers", readonly=True)
+
+    @api.model
+    def _default_param(self, name):
+        return getattr(self.env["res.partner"]._get_risk_config(self.env.company), name)
+
+    @api.constrains("threshold_low", "threshold_high")
+    def _check_thresholds(self):
+        for wizard in self:
+            if wizard.threshold_high < wizard.threshold_low:
+                raise ValidationError(_("High threshold must be ≥ Low threshold."))
+
+    def _transition_html(self, matrix):
+        labels = dict(self.env["pv.debtor.kpi"]._fields["risk_level"]._description_selection(self.env))
+        header = Markup("").join(Markup("<th class='text-end'>%s</th>") % labels[level] for level in RISK_LEVELS)
+        body = Markup("").join(
+            Markup("<tr><th>%s</th>%s</tr>") % (
+                labels[level],
+                Markup("").join(
+                    Markup("<td class='text-end%s'>%s</td>") % (
+                        "" if level == new_level else " fw-bold",
+                        matrix[level][new_level],
+                    )
+                    for new_level in RISK_LEVELS
+                ),
+            )
+            for level in RISK_LEVELS
+        )
+        return Markup(
+            "<table class='table table-sm'><thead><tr><th>%s</th>%s</tr></thead><tbody>%s</tbody></table>"
+        ) % (escape(_("Current → Simulated")), header, body)
+
+    def action_simulate(self):
+        self.ensure_one()
+        Kpi = self.env["pv.debtor.kpi"]
+        model = "pv.debtor.kpi.view" if Kpi._kpi_backend() == "matview" else "pv.debtor.kpi"
+        result = self.env[model].simulate_rescoring(
+            {name: self[name] for name in SIMULATION_PARAMS},
+            [("company_id", "=", self.company_id.id)],
+        )
+        changed = sorted(result["changed"], key=lambda c: -abs(c["new_score"] - (c["score"] or 0)))
+        self.line_ids.unlink()
+        self.write({
+            "total": result["total"],
+            "changed_count": len(changed),
+            "transition_html": self._transition_html(result["matrix"]),
+            "line_ids": [(0, 0, vals) for vals in changed[:SIMULATION_LINE_LIMIT]],
+        })
+        return {
+            "type": "ir.actions.act_window",
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_mode": "form",
+            "target": "new",
+        }
+
+
+class PvRiskSimulationLine(models.TransientModel):
+    _name = "pv.risk.simulation.line"
+    _description = "Customer Risk Simulation Line"
+    _order = "id"
+
+    simulation_id = fields.Many2one("pv.risk.simulation", required=True, ondelete="cascade")
+    company_id = fields.Many2one("res.company")
+    commercial_partner_id = fields.Many2one("res.partner", string="Customer")
+    level = fields.Selection([("low", "Low"), ("medium", "Medium"), ("high", "High")], string="Current Level")
+    score = fields.Integer(string="Current Score")
+    new_level = fields.Selection([("low", "Low"), ("medium", "Medium"), ("high", "High")], string="Simulated Level")
+    new_score = fields.Integer(string="Simulated Score")